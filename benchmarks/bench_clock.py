@@ -0,0 +1,29 @@
+# python -m benchmarks.bench_clock
+import timeit
+from datetime import datetime
+import pytz
+from commons.clock import WallClock, time_int_to_seconds
+
+CALLS = 200_000
+# engine.run and evaluate read the market time several times per tick
+CALLS_PER_TICK = 4
+
+
+def legacy_time_int():
+    return int(datetime.now(pytz.timezone("Asia/Kolkata")).strftime("%H%M%S"))
+
+
+def main():
+    clock = WallClock()
+    # HHMMSS ints jump by 41 or 4041 across a minute or hour, so compare seconds of day
+    drift = abs(time_int_to_seconds(legacy_time_int()) - time_int_to_seconds(clock.time_int()))
+    assert min(drift, 86400 - drift) <= 1
+    legacy = min(timeit.repeat(legacy_time_int, number=CALLS, repeat=5)) / CALLS
+    cached = min(timeit.repeat(clock.time_int, number=CALLS, repeat=5)) / CALLS
+    print(f"pytz strftime : {legacy * 1e9:8.0f} ns/call")
+    print(f"cached clock  : {cached * 1e9:8.0f} ns/call")
+    print(f"saving        : {(legacy - cached) * CALLS_PER_TICK * 1e6:8.2f} us/tick ({legacy / cached:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# python -m benchmarks.bench_instruments [instruments.csv]
+import sys
+import time
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from commons.constants import INDICES
+from commons.enums import ExchangeType, InstrumentType, OptionType, Underlying
+from commons.models import Instrument
+from commons.utils import generate_trading_symbol
+import data
+from data import Cache
+import pricefeed.utils
+from pricefeed.utils import filter_master_data_by_index
+
+REPEAT = 3
+
+
+def synthetic_master() -> pd.DataFrame:
+    # roughly the shape of the kite master: ~20 option expiries per index plus
+    # a long tail of stock derivatives and cash instruments
+    rows = []
+    token = 1
+    expiries = [date.today() + timedelta(days=7 * week) for week in range(1, 21)]
+    for underlying, (exchange, name) in INDICES.items():
+        for expiry in expiries:
+            for strike in range(15000, 65000, 100):
+                for option_type in ("CE", "PE"):
+                    rows.append((token, token, f"{name}{strike}{option_type}", name, expiry.isoformat(),
+                                 float(strike), 75, option_type, f"{exchange}-OPT", exchange))
+                    token += 1
+        for expiry in expiries[3:12:4]:
+            rows.append((token, token, f"{name}FUT", name, expiry.isoformat(), 0.0, 75, "FUT",
+                         f"{exchange}-FUT", exchange))
+            token += 1
+    for symbol in ("NIFTY 50", "NIFTY BANK"):
+        rows.append((token, token, symbol, symbol, np.nan, 0.0, 0, "EQ", "INDICES", "NSE"))
+        token += 1
+    for stock in range(2000):
+        rows.append((token, token, f"STOCK{stock}", f"STOCK{stock}", np.nan, 0.0, 1, "EQ", "NSE", "NSE"))
+        token += 1
+    return pd.DataFrame(
+        rows,
+        columns=["instrument_token", "exchange_token", "tradingsymbol", "name", "expiry",
+                 "strike", "lot_size", "instrument_type", "segment", "exchange"],
+    )
+
+
+def legacy_register_options(opt_data: pd.DataFrame, exchange: str, underlying: str):
+    for _, row in opt_data.iterrows():
+        generated_trading_symbol = generate_trading_symbol(
+            row["exchange"],
+            row["name"],
+            "OPTIDX",
+            row["expiry_int"],
+            row["strike"],
+            row["instrument_type"],
+        )
+        for key in (generated_trading_symbol, row["instrument_token"]):
+            Cache().push(
+                key,
+                Instrument(
+                    row["instrument_token"],
+                    row["exchange_token"],
+                    ExchangeType(exchange),
+                    Underlying(underlying),
+                    InstrumentType("OPTIDX"),
+                    row["expiry"],
+                    row["strike"],
+                    OptionType(row["instrument_type"]),
+                    generated_trading_symbol,
+                    row["lot_size"],
+                ),
+            )
+        data.instruments.append(
+            Instrument(
+                row["instrument_token"],
+                row["exchange_token"],
+                ExchangeType(exchange),
+                Underlying(underlying),
+                InstrumentType("OPTIDX"),
+                row["expiry"],
+                row["strike"],
+                OptionType(row["instrument_type"]),
+                generated_trading_symbol,
+                row["lot_size"],
+            )
+        )
+
+
+def build_all(master_data: pd.DataFrame) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        Cache().clear()
+        data.instrument_index.clear()
+        data.instruments.clear()
+        started = time.perf_counter()
+        for underlying, (exchange, name) in INDICES.items():
+            filter_master_data_by_index(master_data, exchange, name, underlying)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    if len(sys.argv) > 1:
+        master_data = pd.read_csv(sys.argv[1])
+    else:
+        master_data = synthetic_master()
+
+    register_options = pricefeed.utils.register_options
+    pricefeed.utils.register_options = legacy_register_options
+    legacy = build_all(master_data)
+    legacy_count = len(data.instruments)
+    pricefeed.utils.register_options = register_options
+    bulk = build_all(master_data)
+    assert len(data.instruments) == legacy_count
+
+    print(f"master rows    : {len(master_data)}")
+    print(f"instruments    : {legacy_count}")
+    print(f"iterrows build : {legacy * 1e3:8.1f} ms")
+    print(f"bulk build     : {bulk * 1e3:8.1f} ms ({legacy / bulk:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
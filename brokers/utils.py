@@ -1,7 +1,8 @@
 from copy import deepcopy
 from datetime import datetime
 from commons.models import Order
-from data.models import Cache
+from commons.enums import ExpiryType, Underlying
+from data import instrument_index
 import logging
 
 
@@ -10,9 +11,10 @@ logger = logging.getLogger(__name__)
 
 def get_expiry_code(underlying_name: str, expiry: datetime) -> str:
     expiry = int(expiry.date().strftime("%y%m%d"))
-    weekly_expiry = Cache().pull(f"{underlying_name}_WEEKLY")
-    next_weekly_expiry = Cache().pull(f"{underlying_name}_NEXTWEEKLY")
-    monthly_expiry = Cache().pull(f"{underlying_name}_MONTHLY")
+    underlying = Underlying(underlying_name)
+    weekly_expiry = instrument_index.get_expiry(underlying, ExpiryType.WEEKLY)
+    next_weekly_expiry = instrument_index.get_expiry(underlying, ExpiryType.NEXTWEEKLY)
+    monthly_expiry = instrument_index.get_expiry(underlying, ExpiryType.MONTHLY)
     if underlying_name in ["NIFTY", "SENSEX"]:
         if expiry == monthly_expiry:
             return "CM"
@@ -5,7 +5,7 @@ from datetime import datetime
 from typing import Dict
 from commons.enums import BrokerType, OrderStatus, OrderType, PositionStatus, ExchangeType, LogType
 from commons.models import Order, OrderUpdate, Position, PositionType, Instrument
-from data import Cache
+from data import Cache, instrument_index
 from config import Config
 from data import Cache
 from engine.utils import get_instrument_by_token
@@ -97,7 +97,7 @@ def place_order(order: Order):
         "Content-Type": "application/json",
         "authorization": Config.ACCESS_TOKEN,
     }
-    instrument: Instrument = Cache().pull(order.instrument_id)
+    instrument: Instrument = instrument_index.get(order.instrument_id)
     exchange = instrument.exchange
     if exchange == ExchangeType.NFO:
         exchange = "NSEFO"
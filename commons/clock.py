@@ -0,0 +1,98 @@
+import time
+import threading
+from datetime import datetime
+
+IST_OFFSET_SECONDS = 19800
+
+
+def seconds_to_time_int(seconds_of_day: int) -> int:
+    hours, remainder = divmod(seconds_of_day % 86400, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return hours * 10000 + minutes * 100 + seconds
+
+
+def time_int_to_seconds(time_int: int) -> int:
+    hours, remainder = divmod(int(time_int), 10000)
+    minutes, seconds = divmod(remainder, 100)
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def time_int_of(epoch_second: int) -> int:
+    return seconds_to_time_int(epoch_second + IST_OFFSET_SECONDS)
+
+
+class WallClock:
+    def __init__(self):
+        self._cached = (-1, 0)
+
+    def time(self) -> float:
+        return time.time()
+
+    def time_ns(self) -> int:
+        return time.time_ns()
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def time_int(self) -> int:
+        second = int(time.time())
+        cached_second, cached_time_int = self._cached
+        if second == cached_second:
+            return cached_time_int
+        cached_time_int = time_int_of(second)
+        self._cached = (second, cached_time_int)
+        return cached_time_int
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+
+class SimulatedClock:
+    def __init__(self, start_ns: int = 0):
+        self._now_ns = start_ns
+        self._advanced = threading.Condition()
+
+    def advance_to(self, timestamp_ns: int):
+        with self._advanced:
+            if timestamp_ns > self._now_ns:
+                self._now_ns = timestamp_ns
+                self._advanced.notify_all()
+
+    def time(self) -> float:
+        return self._now_ns / 1e9
+
+    def time_ns(self) -> int:
+        return self._now_ns
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self._now_ns / 1e9)
+
+    def time_int(self) -> int:
+        return time_int_of(self._now_ns // 1_000_000_000)
+
+    def sleep(self, seconds: float):
+        wake_ns = self._now_ns + int(seconds * 1e9)
+        with self._advanced:
+            self._advanced.wait_for(lambda: self._now_ns >= wake_ns, timeout=seconds)
+
+
+_clock = WallClock()
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(clock):
+    global _clock
+    _clock = clock
+
+
+def seconds_until(time_int: int) -> float:
+    seconds_of_day = (_clock.time() + IST_OFFSET_SECONDS) % 86400
+    return time_int_to_seconds(time_int) - seconds_of_day
+
+
+def epoch_of_time_int(time_int: int, reference_second: int) -> int:
+    day_start = (reference_second + IST_OFFSET_SECONDS) // 86400 * 86400 - IST_OFFSET_SECONDS
+    return day_start + time_int_to_seconds(time_int)
@@ -126,6 +126,11 @@ class LogType(enum.Enum):
     STRADDLEUPDATE = "STRADDLEUPDATE"
 
 
+class StreamMode(enum.Enum):
+    FIFO = "FIFO"
+    CONFLATE = "CONFLATE"
+
+
 class SlTgType(enum.Enum):
     POINTS = 'POINTS'
     PERCENTAGE = 'PERCENTAGE'
@@ -1,7 +1,7 @@
 from datetime import datetime
-import time
 from typing import List, Dict
 from commons.constants import FREEZE_QTY
+from commons.clock import get_clock
 from commons.enums import (
     StrategyStatus,
     Underlying,
@@ -29,15 +29,41 @@ class Singleton(object):
 
 
 class Ohlc:
-    def __init__(self, token: str, ltp: float):
+    __slots__ = (
+        "token",
+        "ltp",
+        "received_ns",
+        "seq",
+        "high",
+        "low",
+    )
+
+    def __init__(self, token: str, ltp: float, received_ns: int = 0, seq: int = 0):
         self.token = token
         self.ltp = ltp
+        self.received_ns = received_ns
+        self.seq = seq
+        self.high = ltp
+        self.low = ltp
 
     def __str__(self) -> str:
-        return f"Ohlc(token: {self.token}, ltp: {self.ltp})"
+        return f"Ohlc(token: {self.token}, ltp: {self.ltp}, seq: {self.seq})"
 
 
 class Instrument:
+    __slots__ = (
+        "pricefeed_token",
+        "exchange_token",
+        "exchange",
+        "underlying",
+        "instrument_type",
+        "expiry_date",
+        "strike_price",
+        "option_type",
+        "trading_symbol",
+        "lot_size",
+    )
+
     def __init__(
         self,
         pricefeed_token: str,
@@ -81,6 +107,21 @@ class UserInstance:
 
 
 class Position:
+    __slots__ = (
+        "initial_order_id",
+        "instrument_id",
+        "net_buy_quantity",
+        "buy_average_price",
+        "buy_value",
+        "net_sell_quantity",
+        "sell_average_price",
+        "sell_value",
+        "net_quantity",
+        "status",
+        "ltp",
+        "orders",
+    )
+
     def __init__(self, initial_order_id: str, instrument_id: str):
         self.initial_order_id = initial_order_id
         self.instrument_id = instrument_id
@@ -98,6 +139,27 @@ class Position:
 
 
 class Order:
+    __slots__ = (
+        "id",
+        "strategy_id",
+        "instrument_id",
+        "product_type",
+        "order_type",
+        "side",
+        "limit_price",
+        "trigger_price",
+        "quantity",
+        "creation_time",
+        "broker_order_id",
+        "average_trade_price",
+        "traded_quantity",
+        "status",
+        "error_code",
+        "error_message",
+        "last_update_time",
+        "child_orders",
+    )
+
     def __init__(
         self,
         id: str,
@@ -119,14 +181,14 @@ class Order:
         self.limit_price = limit_price
         self.trigger_price = trigger_price
         self.quantity = quantity
-        self.creation_time = datetime.now()
+        self.creation_time = get_clock().now()
         self.broker_order_id = None
         self.average_trade_price = 0.0
         self.traded_quantity = 0
         self.status = OrderStatus.CREATED
         self.error_code = 0
         self.error_message = None
-        self.last_update_time = datetime.now()
+        self.last_update_time = get_clock().now()
         self.child_orders: Dict[str, Order] = {}
         
     def __str__(self):
@@ -227,7 +289,7 @@ class Strategy:
         self.ongoing_shift = False
         self.option_to_shift = None
 
-        self.last_sync_time = time.time()
+        self.last_sync_time = get_clock().time()
         self.status: StrategyStatus = StrategyStatus.CREATED
         self.message: str = None
 
@@ -292,8 +354,11 @@ class DummyStrategy:
 
         self.mtm_value: float = 0  
         self.underlying_value: float = 0
+        self.entry_price: float = None
+        self.target_price: float = None
+        self.stoploss_price: float = None
         self.position:Position = None 
-        self.last_sync_time = time.time()
+        self.last_sync_time = get_clock().time()
         self.status: StrategyStatus = StrategyStatus.CREATED
 
 
@@ -3,12 +3,12 @@ from datetime import date, datetime
 import logging
 from time import time
 from time import sleep
-import pytz
 import data
 
 from commons.constants import HOLIDAYS
 from commons.models import Singleton
-from commons.enums import LimitType
+from commons.clock import get_clock
+from commons.enums import ExpiryType, LimitType, Underlying
 
 logger = logging.getLogger(__name__)
 
@@ -73,7 +73,7 @@ def round_to(n, precision):
 
 
 def get_current_time_int(): 
-    return int(datetime.now(pytz.timezone("Asia/Kolkata")).strftime("%H%M%S"))
+    return get_clock().time_int()
 
 
 def is_holiday(trading_day: date):
@@ -93,12 +93,12 @@ class OrderId(Singleton):
 
 
 def get_cache_data(underlying: str):
-    return data.Cache().pull(underlying)
+    return data.instrument_index.underlyings.get(Underlying(underlying))
 
 
 
 def get_underlying_expiry(underlying: str, expiry_type: str):
-    return data.Cache().pull(f"{underlying}_{expiry_type}")
+    return data.instrument_index.get_expiry(Underlying(underlying), ExpiryType(expiry_type))
 
 
 def calc_by_points(underlying_value: float, limit_type:str, strategy_value: int) -> float:
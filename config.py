@@ -1,7 +1,7 @@
 import os
 import json
 from dotenv import load_dotenv
-from commons.enums import ProductType, OrderType
+from commons.enums import ProductType, OrderType, StreamMode
 
 load_dotenv(".env")
 
@@ -30,4 +30,22 @@ class Config:
     LOOKUP_KEY = "xts_api.lookup_key"
 
 
-    BROKER = os.environ.get("BROKER")
\ No newline at end of file
+    BROKER = os.environ.get("BROKER")
+
+    STREAM_MODE = StreamMode(os.environ.get("STREAM_MODE", "FIFO"))
+    STRIKE_WINDOW = int(os.environ.get("STRIKE_WINDOW", "0"))
+    STRIKE_WINDOW_LTP_OUTSIDE = eval(os.environ.get("STRIKE_WINDOW_LTP_OUTSIDE", "True"))
+    PRICEFEED_CONNECTIONS = int(os.environ.get("PRICEFEED_CONNECTIONS", "1"))
+    PRICEFEED_TOKENS_PER_CONNECTION = int(os.environ.get("PRICEFEED_TOKENS_PER_CONNECTION", "3000"))
+    PRICEFEED_REDUNDANT = eval(os.environ.get("PRICEFEED_REDUNDANT", "False"))
+    STALE_TOKEN_SECONDS = float(os.environ.get("STALE_TOKEN_SECONDS", "10"))
+    SHARD_STALE_SECONDS = float(os.environ.get("SHARD_STALE_SECONDS", "10"))
+    TICK_JOURNAL_DIR = os.environ.get("TICK_JOURNAL_DIR")
+    REPLAY_FILE = os.environ.get("REPLAY_FILE")
+    REPLAY_SPEED = float(os.environ.get("REPLAY_SPEED", "1"))
+    HISTORY_BARS_DIR = os.environ.get("HISTORY_BARS_DIR")
+    HISTORY_FROM_KITE = eval(os.environ.get("HISTORY_FROM_KITE", "False"))
+    BAR_CAPACITY = int(os.environ.get("BAR_CAPACITY", "500"))
+    INSTRUMENT_CACHE_DIR = os.environ.get("INSTRUMENT_CACHE_DIR", "instrument_cache")
+    LAZY_INSTRUMENTS = eval(os.environ.get("LAZY_INSTRUMENTS", "False"))
+    INSTRUMENT_STRIKE_BAND = int(os.environ.get("INSTRUMENT_STRIKE_BAND", "0"))
\ No newline at end of file
@@ -1,6 +1,8 @@
 from typing import List, Dict
 from commons.models import Instrument, Strategy
-from data.models import Cache as  Cache
+from data.models import Cache as  Cache, InstrumentIndex, TokenRoute
 
 instruments: List[Instrument] = []
-underlying_instruments: Dict[str, Instrument] = {}
\ No newline at end of file
+underlying_instruments: Dict[str, Instrument] = {}
+routes: Dict[int, TokenRoute] = {}
+instrument_index = InstrumentIndex()
\ No newline at end of file
@@ -1,4 +1,7 @@
-from commons.models import Singleton
+from typing import Dict, NamedTuple, Tuple
+import numpy as np
+from commons.enums import ExpiryType, OptionType, Underlying
+from commons.models import Instrument, Singleton
 
 
 class Cache(Singleton):
@@ -19,3 +22,78 @@ class Cache(Singleton):
 
     def __str__(self):
         return str(self.__collection)
+
+
+class TokenRoute(NamedTuple):
+    slot: int
+    underlying: str
+    expiry: str
+    option_type: str
+    strike: float
+    lot_size: int
+
+class InstrumentIndex:
+    def __init__(self):
+        self.by_token: Dict[int, Instrument] = {}
+        self.by_contract: Dict[Tuple[Underlying, int, float, OptionType], Instrument] = {}
+        self.strikes: Dict[Tuple[Underlying, int, OptionType], np.ndarray] = {}
+        self.underlyings: Dict[Underlying, Instrument] = {}
+        self.futures: Dict[Underlying, Instrument] = {}
+        self.expiries: Dict[Tuple[Underlying, ExpiryType], int] = {}
+
+    def add(self, instrument: Instrument, expiry_int: int):
+        self.by_token[int(instrument.pricefeed_token)] = instrument
+        self.by_contract[
+            (instrument.underlying, expiry_int, instrument.strike_price, instrument.option_type)
+        ] = instrument
+
+    def add_underlying(self, instrument: Instrument):
+        self.by_token[int(instrument.pricefeed_token)] = instrument
+        self.underlyings[instrument.underlying] = instrument
+
+    def add_future(self, instrument: Instrument):
+        self.by_token[int(instrument.pricefeed_token)] = instrument
+        self.futures[instrument.underlying] = instrument
+
+    def set_expiry(self, underlying: Underlying, expiry_type: ExpiryType, expiry_int: int):
+        self.expiries[(underlying, expiry_type)] = expiry_int
+
+    def build_strikes(self):
+        grouped: Dict[Tuple[Underlying, int, OptionType], list] = {}
+        for underlying, expiry_int, strike, option_type in self.by_contract:
+            grouped.setdefault((underlying, expiry_int, option_type), []).append(strike)
+        self.strikes = {
+            key: np.unique(np.array(strikes, dtype=np.float64)) for key, strikes in grouped.items()
+        }
+
+    def get(self, token) -> Instrument:
+        return self.by_token.get(int(token))
+
+    def get_option(
+        self, underlying: Underlying, expiry_int: int, strike: float, option_type: OptionType
+    ) -> Instrument:
+        return self.by_contract.get((underlying, expiry_int, strike, option_type))
+
+    def get_expiry(self, underlying: Underlying, expiry_type: ExpiryType) -> int:
+        return self.expiries.get((underlying, expiry_type))
+
+    def nearest_strike(
+        self, underlying: Underlying, expiry_int: int, option_type: OptionType, price: float
+    ):
+        strikes = self.strikes.get((underlying, expiry_int, option_type))
+        if strikes is None or not len(strikes):
+            return None
+        position = int(np.searchsorted(strikes, price))
+        candidates = strikes[max(position - 1, 0):position + 1]
+        return float(candidates[np.abs(candidates - price).argmin()])
+
+    def clear(self):
+        self.by_token.clear()
+        self.by_contract.clear()
+        self.strikes.clear()
+        self.underlyings.clear()
+        self.futures.clear()
+        self.expiries.clear()
+
+    def __len__(self):
+        return len(self.by_token)
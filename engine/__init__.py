@@ -1,12 +1,14 @@
 import json
+from queue import Empty
 from typing import Dict
 from commons.constants import (
     MARKET_END_TIME,
     MARKET_START_TIME, 
     VERSION
 )
-from commons.enums import LogType, Message, MessageType, StrategyStatus
+from commons.enums import BrokerType, LogType, Message, MessageType, StrategyStatus
 from commons.models import Ohlc, Strategy, DummyStrategy
+from commons.clock import SimulatedClock, get_clock, seconds_until, set_clock
 from commons.utils import (
     get_current_time_int,
     get_cache_data,
@@ -15,8 +17,12 @@ from commons.utils import (
 import data
 from engine.utils import calculate_pnl, parse_strategy, new_parse_strategy
 from engine import evaluator
+from engine.dispatch import StrategyIndex
+from engine.scheduler import Scheduler, after
 from errors.system_defined import BrokerError
 import pricefeed
+from pricefeed.history import prefill_range
+from pricefeed.stream import TickBatch
 from pricefeed.utils import (
     load_instruments, 
 )
@@ -24,7 +30,6 @@ import brokers.zerodha
 import brokers.xts
 from config import Config
 import logging
-import time
 import user_com
 import threading
 
@@ -32,69 +37,160 @@ import threading
 
 logger = logging.getLogger()
 
+# only these strategies hold broker positions that need syncing
+MAINTAINED_STATUSES = (StrategyStatus.RUNNING, StrategyStatus.SQUARING_OFF)
+
 
 def setup():
     logger.info(VERSION)
+    if Config.REPLAY_FILE:
+        if Config.BROKER != BrokerType.DUMMY.name:
+            # replayed ticks must never reach a live broker
+            logger.warning(f"Replay forces the {BrokerType.DUMMY.name} broker instead of {Config.BROKER}")
+            Config.BROKER = BrokerType.DUMMY.name
+        set_clock(SimulatedClock())
     logger.info(f"BROKER: {Config.BROKER}")
-    brokers.zerodha.login()
-    brokers.xts.login()
+    if not Config.REPLAY_FILE:
+        brokers.zerodha.login()
+        brokers.xts.login()
     load_instruments()
-    logger.info("Waiting for market to start...")
-    while get_current_time_int() <= MARKET_START_TIME - 1500:
-        time.sleep(0.5)
+    if Config.REPLAY_FILE:
+        logger.info(f"Replaying {Config.REPLAY_FILE} at speed {Config.REPLAY_SPEED}")
+    else:
+        logger.info("Waiting for market to start...")
+    while not Config.REPLAY_FILE and get_current_time_int() <= MARKET_START_TIME - 1500:
+        get_clock().sleep(0.5)
         continue
     pricefeed.connect()
     threading.Thread(target=pricefeed.heartbeat, daemon=True).start()
 
+def schedule_deadlines(scheduler: Scheduler, strategy: DummyStrategy):
+    scheduler.schedule(after(int(strategy.range_end_time)), strategy)
+    scheduler.schedule(after(int(strategy.strategy_end_time)), strategy)
+
+
+def prefill(strategy: DummyStrategy):
+    found = prefill_range(
+        int(strategy.pricefeed_token),
+        int(strategy.range_start_time),
+        int(strategy.range_end_time),
+    )
+    if found is None:
+        logger.warning(f"No recorded range for strategy {strategy.id}, range starts from the next tick")
+        return
+    high, low = found
+    evaluator.update_range(strategy, low, high)
+    logger.info(f"Strategy {strategy.id} range prefilled High: {high} Low: {low}")
+
+
+def register_strategies(user_raw_data, strategies: StrategyIndex, scheduler: Scheduler):
+    if isinstance(user_raw_data, dict):
+        user_raw_data = [user_raw_data]
+    for strategy_json in user_raw_data:
+        if strategy_json["ID"] in strategies:
+            continue
+        strategy = new_parse_strategy(strategy_json)
+        pricefeed.subscribe_stream([strategy.pricefeed_token])
+        if not Config.REPLAY_FILE and get_current_time_int() > int(strategy.range_start_time):
+            prefill(strategy)
+        strategies.add(strategy)
+        pricefeed.watch_token(strategy.pricefeed_token)
+        schedule_deadlines(scheduler, strategy)
+        logger.info(f"Strategy {strategy.id} registered on token {strategy.pricefeed_token}")
+
+
+def maintain(strategy_obj: DummyStrategy):
+    if get_clock().time() - strategy_obj.last_sync_time >=1:
+        evaluator.sync_positions(strategy_obj)
+        strategy_obj.last_sync_time = get_clock().time()
+
+    if strategy_obj.status == StrategyStatus.SQUARING_OFF:
+        logger.info(F"Inside Squaring off section !")
+        if get_clock().time() - strategy_obj.last_sync_time > 2:
+            evaluator.sync_positions(strategy_obj)
+            logger.info("Still Syncing")
+            strategy_obj.last_sync_time = get_clock().time()
+
+        if evaluator.is_completed(strategy_obj):
+            pnl = calculate_pnl(strategy_obj)
+            strategy_obj.status = StrategyStatus.COMPLETED
+            logger.info(f"Strategy {strategy_obj.id} is Stopped @ {round(pnl,2)}/-")
+
+
 def run():
-    current_strategy = None
-    fe_id_map: Dict[str, DummyStrategy] = {}
+    strategies = StrategyIndex()
+    scheduler = Scheduler()
+    scheduler.schedule(after(MARKET_END_TIME, 15))
+    last_maintained = 0.0
 
     while True:
         user_raw_data = user_com.get_data()
         if user_raw_data:
-            if fe_id_map.get('1') is None:
-                strategy = new_parse_strategy(user_raw_data)
-                fe_id_map["1"] = strategy
-                current_strategy = strategy
-            
-            if current_strategy is None:
-                continue
-                 
-        if get_current_time_int()<= MARKET_START_TIME:
-            time.sleep(0.5)
-            continue
-        
+            register_strategies(user_raw_data, strategies, scheduler)
+
         if get_current_time_int()>= MARKET_END_TIME + 15:
             logger.info(f"Market is closed !")
             return
+
+        if pricefeed.replay_finished():
+            logger.info(f"Replay finished !")
+            return
+
+        if not len(strategies):
+            pricefeed.idle(0.5)
+            continue
+                 
+        if get_current_time_int()<= MARKET_START_TIME:
+            pricefeed.idle(0.5)
+            continue
         
-        underlying_ohlc: Ohlc = pricefeed.get_quote_from_stream()
+        timeout = None
+        next_deadline = scheduler.next_deadline()
+        if next_deadline is not None:
+            timeout = max(seconds_until(next_deadline), 0)
+        try:
+            batch: TickBatch = pricefeed.get_ticks_from_stream(timeout)
+        except Empty:
+            batch = None
+        now_int = get_current_time_int()
+        due = scheduler.pop_due(now_int)
 
-        for _, strategy_obj in fe_id_map.items():
+        quotes = batch.summaries() if batch is not None else {}
+        for strategy_obj in due:
+            if strategy_obj is None or int(strategy_obj.pricefeed_token) in quotes:
+                continue
+            ltp = pricefeed.get_quote(strategy_obj.pricefeed_token)
+            if ltp is not None:
+                logger.debug(f"Deadline reached for strategy {strategy_obj.id}")
+                quotes[int(strategy_obj.pricefeed_token)] = (ltp, ltp, ltp)
 
-            if strategy_obj is None:
+        for token, (ltp, high, low) in quotes.items():
+            book = strategies.book_for(token)
+            if book is None:
                 continue
+            for strategy_obj in book.scan(now_int, ltp, high, low):
+                try:
+                    evaluator.evaluate(
+                        strategy_obj,
+                        ltp,
+                        strategy_obj.underlying_expiry,
+                        high=high,
+                        low=low,
+                    )
+                except Exception as e:
+                    logger.error(f"Error : {e}")
+                book.sync(strategy_obj)
 
+        if get_clock().time() - last_maintained < 1:
+            continue
+        last_maintained = get_clock().time()
+        for strategy_obj in strategies:
+            if strategy_obj.status not in MAINTAINED_STATUSES:
+                continue
+            previous = (strategy_obj.status, strategy_obj.entry_price)
             try:
-                if strategy_obj and underlying_ohlc.token == strategy_obj.pricefeed_token:
-                    evaluator.evaluate(strategy_obj, underlying_ohlc.ltp, strategy_obj.underlying_expiry)
-                
-                if time.time() - strategy_obj.last_sync_time >=1:
-                    evaluator.sync_positions(strategy_obj)
-                    strategy_obj.last_sync_time = time.time()
-
-                if strategy_obj.status == StrategyStatus.SQUARING_OFF:
-                    logger.info(F"Inside Squaring off section !")
-                    if time.time() - strategy_obj.last_sync_time > 2:
-                        evaluator.sync_positions(strategy_obj)
-                        logger.info("Still Syncing")
-                        strategy_obj.last_sync_time = time.time()
-
-                    if evaluator.is_completed(strategy_obj):
-                        pnl = calculate_pnl(strategy_obj)
-                        strategy_obj.status = StrategyStatus.COMPLETED
-                        logger.info(f"Strategy is Stopped @ {round(pnl,2)}/-")
-
+                maintain(strategy_obj)
             except Exception as e:
-                logger.error(f"Error : {e}")
\ No newline at end of file
+                logger.error(f"Error : {e}")
+            if (strategy_obj.status, strategy_obj.entry_price) != previous:
+                strategies.book_for(int(strategy_obj.pricefeed_token)).sync(strategy_obj)
@@ -0,0 +1,95 @@
+from typing import Dict, List
+import numpy as np
+from commons.enums import StrategyStatus
+from commons.models import DummyStrategy
+from engine.evaluator import exit_thresholds
+from engine.ranges import RangeTracker
+from pricefeed import tick_book
+
+CREATED, RUNNING, INACTIVE = 0, 1, 2
+
+
+def status_code(status: StrategyStatus) -> int:
+    if status == StrategyStatus.CREATED:
+        return CREATED
+    if status == StrategyStatus.RUNNING:
+        return RUNNING
+    return INACTIVE
+
+
+class StrategyBook:
+    def __init__(self, token: int, ranges: RangeTracker):
+        self.token = token
+        self.ranges = ranges
+        self.strategies: List[DummyStrategy] = []
+        self.positions: Dict[str, int] = {}
+        self.status = np.zeros(0, dtype=np.int8)
+        self.window = np.zeros(0, dtype=np.int64)
+        self.range_end = np.zeros(0, dtype=np.int64)
+        self.end_time = np.zeros(0, dtype=np.int64)
+        self.slot = np.zeros(0, dtype=np.int64)
+        self.target = np.zeros(0)
+        self.stoploss = np.zeros(0)
+        self.uncompiled = np.zeros(0, dtype=bool)
+
+    def add(self, strategy: DummyStrategy):
+        self.positions[strategy.id] = len(self.strategies)
+        self.strategies.append(strategy)
+        self.status = np.append(self.status, CREATED)
+        window = self.ranges.subscribe(
+            self.token, int(strategy.range_start_time), int(strategy.range_end_time)
+        )
+        self.window = np.append(self.window, window)
+        self.range_end = np.append(self.range_end, int(strategy.range_end_time))
+        self.end_time = np.append(self.end_time, int(strategy.strategy_end_time))
+        self.slot = np.append(self.slot, -1)
+        self.target = np.append(self.target, np.nan)
+        self.stoploss = np.append(self.stoploss, np.nan)
+        self.uncompiled = np.append(self.uncompiled, False)
+        self.sync(strategy)
+
+    def scan(self, now_int: int, ltp: float, high: float, low: float) -> List[DummyStrategy]:
+        self.ranges.update(self.token, now_int, high, low)
+        range_high = self.ranges.high[self.window]
+        range_low = self.ranges.low[self.window]
+        breakout = (
+            (self.status == CREATED)
+            & (now_int > self.range_end)
+            & ((ltp > range_high) | (ltp < range_low))
+        )
+
+        held = self.slot >= 0
+        option_ltp = np.full(len(self.slot), np.nan)
+        option_ltp[held] = tick_book.ltp[self.slot[held]]
+        exits = (self.status == RUNNING) & (
+            (option_ltp > self.target)
+            | (option_ltp < self.stoploss)
+            | self.uncompiled
+            | (now_int > self.end_time)
+        )
+
+        selected = []
+        for index in np.flatnonzero(breakout | exits).tolist():
+            strategy = self.strategies[index]
+            strategy.underlying_high = float(range_high[index])
+            strategy.underlying_low = float(range_low[index])
+            selected.append(strategy)
+        return selected
+
+    def sync(self, strategy: DummyStrategy):
+        index = self.positions[strategy.id]
+        previous = self.status[index]
+        self.status[index] = status_code(strategy.status)
+        if self.status[index] == CREATED:
+            self.ranges.seed(self.window[index], strategy.underlying_high, strategy.underlying_low)
+        if self.status[index] != RUNNING:
+            self.uncompiled[index] = False
+            return
+        if previous != RUNNING:
+            route = tick_book.routes.get(strategy.position.instrument_id)
+            self.slot[index] = route.slot if route else -1
+        self.target[index], self.stoploss[index] = exit_thresholds(strategy)
+        self.uncompiled[index] = strategy.entry_price is None
+
+    def __len__(self):
+        return len(self.strategies)
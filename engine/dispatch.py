@@ -0,0 +1,31 @@
+from typing import Dict, Iterator
+from commons.models import DummyStrategy
+from engine.book import StrategyBook
+from engine.ranges import RangeTracker
+
+
+class StrategyIndex:
+    def __init__(self):
+        self.by_id: Dict[str, DummyStrategy] = {}
+        self.by_token: Dict[int, StrategyBook] = {}
+        self.ranges = RangeTracker()
+
+    def add(self, strategy: DummyStrategy):
+        self.by_id[strategy.id] = strategy
+        token = int(strategy.pricefeed_token)
+        book = self.by_token.get(token)
+        if book is None:
+            book = self.by_token[token] = StrategyBook(token, self.ranges)
+        book.add(strategy)
+
+    def book_for(self, token: int) -> StrategyBook:
+        return self.by_token.get(token)
+
+    def __contains__(self, strategy_id: str):
+        return strategy_id in self.by_id
+
+    def __iter__(self) -> Iterator[DummyStrategy]:
+        return iter(list(self.by_id.values()))
+
+    def __len__(self):
+        return len(self.by_id)
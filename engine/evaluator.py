@@ -1,9 +1,10 @@
 import datetime
 import json
 import uuid
+from typing import Tuple
 from commons.enums import InstrumentType, Message, MessageType, OptionType, OrderType, PositionStatus, PositionType, StrategyStatus, SlTgType, LimitType
 from errors.system_defined import BrokerError
-from pricefeed import get_quote
+from pricefeed import get_quote, pin_tokens
 from commons.utils import get_current_time_int, calc_by_points, calc_by_percentage
 from commons.models import Order, Position, Strategy, DummyStrategy
 from config import Config
@@ -16,18 +17,86 @@ from commons.constants import STRIKE_DIFF
 
 logger = logging.getLogger(__name__)
 
-def evaluate(strategy: DummyStrategy, ltp: float, underlying_expiry: int):
+NAN = float("nan")
+
+def update_range(strategy: DummyStrategy, low: float, high: float):
+    if strategy.underlying_high == None and strategy.underlying_low == None:
+        strategy.underlying_high = high
+        strategy.underlying_low = low
+
+    if high > strategy.underlying_high:
+        strategy.underlying_high = high
+
+    if low < strategy.underlying_low:
+        strategy.underlying_low = low
+
+
+def compile_exits(strategy: DummyStrategy, entry_price: float):
+    strategy.entry_price = entry_price
+    strategy.target_price = strategy.stoploss_price = None
+    if strategy.sl_tg_type is None or entry_price is None:
+        return
+    if strategy.sl_tg_type == SlTgType.POINTS.value:
+        calc = calc_by_points
+    else:
+        calc = calc_by_percentage
+    if strategy.limit_type in (LimitType.TARGET.value, LimitType.BOTH.value) and strategy.strategy_target:
+        strategy.target_price = calc(entry_price, LimitType.TARGET.value, strategy.strategy_target)
+    if strategy.limit_type in (LimitType.STOPLOSS.value, LimitType.BOTH.value) and strategy.strategy_stoploss:
+        strategy.stoploss_price = calc(entry_price, LimitType.STOPLOSS.value, strategy.strategy_stoploss)
+    logger.info(f"Exits compiled at entry {entry_price} : target {strategy.target_price} : stoploss {strategy.stoploss_price}")
+
+
+def exit_thresholds(strategy: DummyStrategy) -> Tuple[float, float]:
+    target = NAN if strategy.target_price is None else strategy.target_price
+    stoploss = NAN if strategy.stoploss_price is None else strategy.stoploss_price
+    return target, stoploss
+
+
+def exit_position(strategy: DummyStrategy):
+    call_order = Order(
+        uuid.uuid4().hex,
+        strategy.id,
+        strategy.position.instrument_id,
+        Config.PRODUCT_TYPE,
+        Config.ORDER_TYPE,
+        PositionType.SELL,
+        0,
+        0,
+        strategy.lots * strategy.lots_size
+    )
+
+    strategy.position = Position(
+        call_order.id,
+        call_order.instrument_id
+    )
+
+    place_order(
+        call_order, 
+        strategy.lots_size, 
+        strategy.freeze_qty
+    )
+
+    strategy.position.net_buy_quantity = call_order.quantity
+    strategy.position.orders.append(call_order)
+
+    strategy.status = StrategyStatus.SQUARING_OFF
+
+
+def evaluate(
+    strategy: DummyStrategy,
+    ltp: float,
+    underlying_expiry: int,
+    high: float = None,
+    low: float = None,
+):
     if strategy.status == StrategyStatus.CREATED:
         if int(strategy.range_start_time) <= get_current_time_int() <= int(strategy.range_end_time):
-            if strategy.underlying_high == None and strategy.underlying_low == None:
-                strategy.underlying_high = ltp
-                strategy.underlying_low = ltp
-                
-            if ltp > strategy.underlying_high:
-                strategy.underlying_high = ltp
-
-            elif ltp < strategy.underlying_low:
-                strategy.underlying_low = ltp
+            update_range(
+                strategy,
+                ltp if low is None else low,
+                ltp if high is None else high,
+            )
 
         elif get_current_time_int() > int(strategy.range_end_time):
             logger.info("Strategy Range time is Ended")
@@ -46,6 +115,8 @@ def evaluate(strategy: DummyStrategy, ltp: float, underlying_expiry: int):
                    
 
                     logger.info(f"High Break at ltp: {ltp} : High : {strategy.underlying_high} : instrument : {instrument}")
+                    if instrument is None:
+                        return
                 
                     call_order = Order(
                         uuid.uuid4().hex,
@@ -63,6 +134,7 @@ def evaluate(strategy: DummyStrategy, ltp: float, underlying_expiry: int):
                         call_order.id,
                         call_order.instrument_id
                     )
+                    pin_tokens([call_order.instrument_id])
 
                     place_order(
                         call_order, 
@@ -75,6 +147,7 @@ def evaluate(strategy: DummyStrategy, ltp: float, underlying_expiry: int):
 
                     strategy.mtm_value = get_quote(strategy.position.instrument_id)
                     logger.info(f"MTM : {strategy.mtm_value} for instrument : {instrument.trading_symbol}")
+                    compile_exits(strategy, strategy.mtm_value)
 
                     strategy.status = StrategyStatus.RUNNING
 
@@ -94,6 +167,8 @@ def evaluate(strategy: DummyStrategy, ltp: float, underlying_expiry: int):
                     
                     
                     logger.info(f"Low Break at ltp: {ltp} : Low  : {strategy.underlying_low} : instrument : {instrument}")
+                    if instrument is None:
+                        return
 
                     put_order = Order(
                         uuid.uuid4().hex,
@@ -111,6 +186,7 @@ def evaluate(strategy: DummyStrategy, ltp: float, underlying_expiry: int):
                         put_order.id,
                         put_order.instrument_id
                     )
+                    pin_tokens([put_order.instrument_id])
 
                     place_order(put_order, strategy.lots_size, strategy.freeze_qty)
 
@@ -119,6 +195,7 @@ def evaluate(strategy: DummyStrategy, ltp: float, underlying_expiry: int):
 
                     strategy.mtm_value = get_quote(strategy.position.instrument_id)
                     logger.info(f"MTM : {strategy.mtm_value} for instrument : {instrument.trading_symbol}")
+                    compile_exits(strategy, strategy.mtm_value)
 
                     strategy.status = StrategyStatus.RUNNING
 
@@ -128,303 +205,18 @@ def evaluate(strategy: DummyStrategy, ltp: float, underlying_expiry: int):
 
     elif strategy.status == StrategyStatus.RUNNING:
         if get_current_time_int() > int(strategy.range_end_time):
-            if strategy.sl_tg_type is not None:
-                underlying_mtm = get_quote(strategy.position.instrument_id)  
-                if strategy.sl_tg_type  == SlTgType.POINTS.value:
-                    if strategy.limit_type == LimitType.TARGET.value:
-                        if strategy.strategy_target:
-                            
-                            limit_value = calc_by_points(strategy.mtm_value, strategy.limit_type, strategy.strategy_target)
-                            if underlying_mtm > limit_value:
-                                logger.info(f"Target Hit ! ltp : {underlying_mtm} limit value : {limit_value}")
-                        
-                                call_order = Order(
-                                    uuid.uuid4().hex,
-                                    strategy.id,
-                                    strategy.position.instrument_id,
-                                    Config.PRODUCT_TYPE,
-                                    Config.ORDER_TYPE,
-                                    PositionType.SELL,
-                                    0,
-                                    0,
-                                    strategy.lots * strategy.lots_size
-                                )
-
-                                strategy.position = Position(
-                                    call_order.id,
-                                    call_order.instrument_id
-                                )
-
-                                place_order(
-                                    call_order, 
-                                    strategy.lots_size, 
-                                    strategy.freeze_qty
-                                )
-
-                                strategy.position.net_buy_quantity = call_order.quantity
-                                strategy.position.orders.append(call_order)
-
-                                strategy.status = StrategyStatus.SQUARING_OFF
-
-                                # logger.info(f"Order Placed for Target Hit {instrument.trading_symbol}")
-  
-                    if strategy.limit_type == LimitType.STOPLOSS.value:
-                        if strategy.strategy_stoploss:
-                            limit_value = calc_by_points(strategy.mtm_value, strategy.limit_type, strategy.strategy_target)
-                            if underlying_mtm < limit_value:
-                                
-                                logger.info(f"Stoploss Hit ! ltp : {underlying_mtm} limit value : {limit_value}")
-                        
-                                call_order = Order(
-                                    uuid.uuid4().hex,
-                                    strategy.id,
-                                    strategy.position.instrument_id,
-                                    Config.PRODUCT_TYPE,
-                                    Config.ORDER_TYPE,
-                                    PositionType.SELL,
-                                    0,
-                                    0,
-                                    strategy.lots * strategy.lots_size
-                                )
-
-                                strategy.position = Position(
-                                    call_order.id,
-                                    call_order.instrument_id
-                                )
-
-                                place_order(
-                                    call_order, 
-                                    strategy.lots_size, 
-                                    strategy.freeze_qty
-                                )
-
-                                strategy.position.net_buy_quantity = call_order.quantity
-                                strategy.position.orders.append(call_order)
-
-                                strategy.status = StrategyStatus.SQUARING_OFF
-
-                                # logger.info(f"Order Placed for Stoploss Hit {instrument.trading_symbol}")
-
-                    if strategy.limit_type == LimitType.BOTH.value:
-                        if strategy.strategy_target:
-                            limit_value = calc_by_points(strategy.mtm_value, "TARGET", strategy.strategy_target)
-                            if underlying_mtm > limit_value:
-                               
-                                logger.info(f"Target Hit ! ltp : {underlying_mtm} limit value : {limit_value}")
-                                call_order = Order(
-                                    uuid.uuid4().hex,
-                                    strategy.id,
-                                    strategy.position.instrument_id,
-                                    Config.PRODUCT_TYPE,
-                                    Config.ORDER_TYPE,
-                                    PositionType.SELL,
-                                    0,
-                                    0,
-                                    strategy.lots * strategy.lots_size
-                                )
-
-                                strategy.position = Position(
-                                    call_order.id,
-                                    call_order.instrument_id
-                                )
-
-                                place_order(
-                                    call_order, 
-                                    strategy.lots_size, 
-                                    strategy.freeze_qty
-                                )
-
-                                strategy.position.net_buy_quantity = call_order.quantity
-                                strategy.position.orders.append(call_order)
-
-                                strategy.status = StrategyStatus.SQUARING_OFF
-
-                                # logger.info(f"Order Placed for Target Hit {instrument.trading_symbol}")
-
-                        if strategy.strategy_stoploss:
-                            limit_value = calc_by_points(strategy.mtm_value, "STOPLOSS", strategy.strategy_target)
-                            if underlying_mtm < limit_value:
-                        
-                                logger.info(f"Stoploss Hit ! ltp : {underlying_mtm} limit value : {limit_value}")
-                                call_order = Order(
-                                    uuid.uuid4().hex,
-                                    strategy.id,
-                                    strategy.position.instrument_id,
-                                    Config.PRODUCT_TYPE,
-                                    Config.ORDER_TYPE,
-                                    PositionType.SELL,
-                                    0,
-                                    0,
-                                    strategy.lots * strategy.lots_size
-                                )
-
-                                strategy.position = Position(
-                                    call_order.id,
-                                    call_order.instrument_id
-                                )
-
-                                place_order(
-                                    call_order, 
-                                    strategy.lots_size, 
-                                    strategy.freeze_qty
-                                )
-
-                                strategy.position.net_buy_quantity = call_order.quantity
-                                strategy.position.orders.append(call_order)
-
-                                strategy.status = StrategyStatus.SQUARING_OFF
-
-                                # logger.info(f"Order Placed for Stoploss Hit {instrument.trading_symbol}")
-
-                else:
-                    if strategy.limit_type == LimitType.TARGET.value:
-                        if strategy.strategy_target:
-                           
-                            limit_value = calc_by_percentage(strategy.mtm_value, strategy.limit_type, strategy.strategy_target)
-                            if underlying_mtm > limit_value:
-                                
-                                logger.info(f"Target Hit ! ltp : {underlying_mtm} limit value : {limit_value}")
-                                call_order = Order(
-                                    uuid.uuid4().hex,
-                                    strategy.id,
-                                    strategy.position.instrument_id,
-                                    Config.PRODUCT_TYPE,
-                                    Config.ORDER_TYPE,
-                                    PositionType.SELL,
-                                    0,
-                                    0,
-                                    strategy.lots * strategy.lots_size
-                                )
-
-                                strategy.position = Position(
-                                    call_order.id,
-                                    call_order.instrument_id
-                                )
-
-                                place_order(
-                                    call_order, 
-                                    strategy.lots_size, 
-                                    strategy.freeze_qty
-                                )
-
-                                strategy.position.net_buy_quantity = call_order.quantity
-                                strategy.position.orders.append(call_order)
-
-                                strategy.status = StrategyStatus.SQUARING_OFF
-
-                                # logger.info(f"Order Placed for Target Hit {instrument.trading_symbol}")
-  
-                    if strategy.limit_type == LimitType.STOPLOSS.value:
-                        if strategy.strategy_stoploss:
-                            limit_value = calc_by_percentage(strategy.mtm_value, strategy.limit_type, strategy.strategy_target)
-                            if underlying_mtm < limit_value:
-                                
-                                logger.info(f"Stoploss Hit ! ltp : {underlying_mtm} limit value : {limit_value}")
-                                call_order = Order(
-                                    uuid.uuid4().hex,
-                                    strategy.id,
-                                    strategy.position.instrument_id,
-                                    Config.PRODUCT_TYPE,
-                                    Config.ORDER_TYPE,
-                                    PositionType.SELL,
-                                    0,
-                                    0,
-                                    strategy.lots * strategy.lots_size
-                                )
-
-                                strategy.position = Position(
-                                    call_order.id,
-                                    call_order.instrument_id
-                                )
-
-                                place_order(
-                                    call_order, 
-                                    strategy.lots_size, 
-                                    strategy.freeze_qty
-                                )
-
-                                strategy.position.net_buy_quantity = call_order.quantity
-                                strategy.position.orders.append(call_order)
-
-                                strategy.status = StrategyStatus.SQUARING_OFF
-
-                                # logger.info(f"Order Placed for Stoploss Hit {instrument.trading_symbol}")
-
-                    if strategy.limit_type == LimitType.BOTH.value:
-                        if strategy.strategy_target:
-                            limit_value = calc_by_percentage(strategy.mtm_value, "TARGET", strategy.strategy_target)
-                            if underlying_mtm > limit_value:
-                                
-                                logger.info(f"Target Hit ! ltp : {underlying_mtm} limit value : {limit_value}")
-                                call_order = Order(
-                                    uuid.uuid4().hex,
-                                    strategy.id,
-                                    strategy.position.instrument_id,
-                                    Config.PRODUCT_TYPE,
-                                    Config.ORDER_TYPE,
-                                    PositionType.SELL,
-                                    0,
-                                    0,
-                                    strategy.lots * strategy.lots_size
-                                )
-
-                                strategy.position = Position(
-                                    call_order.id,
-                                    call_order.instrument_id
-                                )
-
-                                place_order(
-                                    call_order, 
-                                    strategy.lots_size, 
-                                    strategy.freeze_qty
-                                )
-
-                                strategy.position.net_buy_quantity = call_order.quantity
-                                strategy.position.orders.append(call_order)
-
-                                strategy.status = StrategyStatus.SQUARING_OFF
-
-                                # logger.info(f"Order Placed for Target Hit {instrument.trading_symbol}")
-
-                        if strategy.strategy_stoploss:
-                            limit_value = calc_by_percentage(strategy.mtm_value, "STOPLOSS", strategy.strategy_target)
-                            if underlying_mtm < limit_value:
-                               
-                                logger.info(f"Stoploss Hit ! ltp : {underlying_mtm} limit value : {limit_value} : instrument : {instrument}")
-                        
-                                call_order = Order(
-                                    uuid.uuid4().hex,
-                                    strategy.id,
-                                    strategy.position.instrument_id,
-                                    Config.PRODUCT_TYPE,
-                                    Config.ORDER_TYPE,
-                                    PositionType.SELL,
-                                    0,
-                                    0,
-                                    strategy.lots * strategy.lots_size
-                                )
-
-                                strategy.position = Position(
-                                    call_order.id,
-                                    call_order.instrument_id
-                                )
-
-                                place_order(
-                                    call_order, 
-                                    strategy.lots_size, 
-                                    strategy.freeze_qty
-                                )
-
-                                strategy.position.net_buy_quantity = call_order.quantity
-                                strategy.position.orders.append(call_order)
-
-                                strategy.status = StrategyStatus.SQUARING_OFF
-
-                                # logger.info(f"Order Placed for Stoploss Hit {}")
-
-
-
-        if get_current_time_int() > int(strategy.strategy_end_time):
+            if strategy.entry_price is None:
+                compile_exits(strategy, get_quote(strategy.position.instrument_id))
+            option_ltp = get_quote(strategy.position.instrument_id)
+            if option_ltp is not None:
+                if strategy.target_price is not None and option_ltp > strategy.target_price:
+                    logger.info(f"Target Hit ! ltp : {option_ltp} limit value : {strategy.target_price}")
+                    exit_position(strategy)
+                elif strategy.stoploss_price is not None and option_ltp < strategy.stoploss_price:
+                    logger.info(f"Stoploss Hit ! ltp : {option_ltp} limit value : {strategy.stoploss_price}")
+                    exit_position(strategy)
+
+        if strategy.status == StrategyStatus.RUNNING and get_current_time_int() > int(strategy.strategy_end_time):
             logger.info(f"Current Time exceeded the Strategy End Time !")
 
             position_to_squareoff = strategy.position
@@ -455,6 +247,15 @@ def sync_positions(strategy: DummyStrategy):
         if strategy.position:
             sync_position(strategy.position) 
 
+    position = strategy.position
+    if (
+        strategy.status == StrategyStatus.RUNNING
+        and position.status == PositionStatus.COMPLETE
+        and position.buy_average_price
+        and position.buy_average_price != strategy.entry_price
+    ):
+        compile_exits(strategy, position.buy_average_price)
+
 
 def is_completed(strategy: DummyStrategy):
     return True
\ No newline at end of file
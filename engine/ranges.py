@@ -0,0 +1,51 @@
+from typing import Dict, Tuple
+import numpy as np
+
+EMPTY = np.zeros(0, dtype=np.int64)
+
+
+class RangeTracker:
+    def __init__(self):
+        self.windows: Dict[Tuple[int, int, int], int] = {}
+        self.token_windows: Dict[int, np.ndarray] = {}
+        self.start = np.zeros(0, dtype=np.int64)
+        self.end = np.zeros(0, dtype=np.int64)
+        self.high = np.zeros(0)
+        self.low = np.zeros(0)
+
+    def subscribe(self, token: int, start: int, end: int) -> int:
+        key = (int(token), int(start), int(end))
+        window = self.windows.get(key)
+        if window is not None:
+            return window
+        window = self.windows[key] = len(self.windows)
+        self.start = np.append(self.start, key[1])
+        self.end = np.append(self.end, key[2])
+        self.high = np.append(self.high, np.nan)
+        self.low = np.append(self.low, np.nan)
+        self.token_windows[key[0]] = np.append(self.token_windows.get(key[0], EMPTY), window)
+        return window
+
+    def update(self, token: int, now_int: int, high: float, low: float):
+        windows = self.token_windows.get(token)
+        if windows is None:
+            return
+        windows = windows[(self.start[windows] <= now_int) & (now_int <= self.end[windows])]
+        if len(windows):
+            self.high[windows] = np.fmax(self.high[windows], high)
+            self.low[windows] = np.fmin(self.low[windows], low)
+
+    def seed(self, window: int, high: float, low: float):
+        if high is not None:
+            self.high[window] = np.fmax(self.high[window], high)
+        if low is not None:
+            self.low[window] = np.fmin(self.low[window], low)
+
+    def range_of(self, window: int):
+        high, low = float(self.high[window]), float(self.low[window])
+        if np.isnan(high) or np.isnan(low):
+            return None
+        return high, low
+
+    def __len__(self):
+        return len(self.windows)
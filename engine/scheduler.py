@@ -0,0 +1,32 @@
+import heapq
+import itertools
+from typing import Any, List, Tuple
+from commons.clock import seconds_to_time_int, time_int_to_seconds
+
+
+def after(time_int: int, seconds: int = 1) -> int:
+    return seconds_to_time_int(time_int_to_seconds(time_int) + seconds)
+
+
+class Scheduler:
+    def __init__(self):
+        self._deadlines: List[Tuple[int, int, Any]] = []
+        self._sequence = itertools.count()
+
+    def schedule(self, time_int: int, target: Any = None):
+        heapq.heappush(self._deadlines, (int(time_int), next(self._sequence), target))
+
+    def next_deadline(self):
+        if not self._deadlines:
+            return None
+        return self._deadlines[0][0]
+
+    def pop_due(self, now_int: int) -> List[Any]:
+        due = []
+        while self._deadlines and self._deadlines[0][0] <= now_int:
+            _, _, target = heapq.heappop(self._deadlines)
+            due.append(target)
+        return due
+
+    def __len__(self):
+        return len(self._deadlines)
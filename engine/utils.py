@@ -1,11 +1,10 @@
 from datetime import datetime
 import json
 import logging
-import time
 from typing import List, Tuple, Dict 
 import uuid
 import requests
-from commons.constants import LOT_SIZE, STRATEGY_PATH, FREEZE_QTY
+from commons.constants import LOT_SIZE, STRATEGY_PATH, FREEZE_QTY, STRIKE_DIFF
 from commons.enums import (
     ExchangeType,
     ExpiryType,
@@ -17,8 +16,9 @@ from commons.enums import (
 )
 import uuid
 from commons.models import Instrument, Ohlc, Strategy, DummyStrategy
-from commons.utils import generate_trading_symbol, round_to, get_cache_data, get_underlying_expiry
-from data.models import Cache
+from commons.clock import get_clock
+from commons.utils import round_to, get_cache_data, get_underlying_expiry
+from data import instrument_index
 import pricefeed
 from config import Config
 from user_com import push_message
@@ -31,11 +31,11 @@ def get_atm(ltp: float, strike_diff: int):
 
 
 def get_pricefeed_token(instrument_token):
-    return Cache().pull(instrument_token).pricefeed_token
+    return instrument_index.get(instrument_token).pricefeed_token
 
 
 def get_instrument_by_token(instrument_token) -> Instrument:
-    instrument_data = Cache().pull(instrument_token)
+    instrument_data = instrument_index.get(instrument_token)
     return instrument_data
 
 
@@ -46,17 +46,16 @@ def get_instrument(
     strike_price: float,
     option_type: OptionType,
 ) -> Instrument:
-    exchange = ExchangeType.NFO
-    return Cache().pull(
-        generate_trading_symbol(
-            exchange.name,
-            underlying.name,
-            instrument_type.name,
-            expiry_int,
-            strike_price,
-            option_type.name,
-        )
-    )
+    instrument = instrument_index.get_option(underlying, expiry_int, strike_price, option_type)
+    if instrument is None:
+        listed_strike = instrument_index.nearest_strike(underlying, expiry_int, option_type, strike_price)
+        # only absorb rounding of the requested strike, never trade a different strike
+        if listed_strike is None or abs(listed_strike - strike_price) > STRIKE_DIFF[underlying.name] / 2:
+            logger.error(f"Strike {strike_price} not listed for {underlying.name} {expiry_int}, nearest is {listed_strike}")
+            return None
+        logger.warning(f"Strike {strike_price} not listed for {underlying.name} {expiry_int}, using {listed_strike}")
+        instrument = instrument_index.get_option(underlying, expiry_int, listed_strike, option_type)
+    return instrument
 
 
 def get_instrument_by_price(
@@ -66,9 +65,9 @@ def get_instrument_by_price(
     option_premium: float,
     option_comp_op: str,
 ) -> Instrument:
-    expiry_int = Cache().pull(f"{underlying.name}_{expiry_type.name}")
+    expiry_int = instrument_index.get_expiry(underlying, expiry_type)
     expiry = datetime.strptime(
-        str(Cache().pull(f"{underlying.name}_{expiry_type.name}")),
+        str(expiry_int),
         "%y%m%d",
     ).strftime("%Y-%m-%d")
     minimum_distance = float("inf")
@@ -116,16 +115,9 @@ def get_instrument_by_price(
                 selected_hedge_strike = strike
                 break
 
-    exchange = ExchangeType.NFO
-    hedge_trading_symbol = generate_trading_symbol(
-        exchange.name,
-        underlying.name,
-        InstrumentType.OPTIDX.name,
-        expiry_int,
-        selected_hedge_strike,
-        option_type.name,
+    hedge_instrument: Instrument = instrument_index.get_option(
+        underlying, expiry_int, selected_hedge_strike, option_type
     )
-    hedge_instrument: Instrument = Cache().pull(hedge_trading_symbol)
     # if not hedge_instrument:
     #     raise StrikeNotFound(f"Unable to get token for: {hedge_trading_symbol}")
     return hedge_instrument
@@ -241,12 +233,12 @@ def check_shift(strategy: Strategy):
             "message": f"Shift delay started."
         }
         user_com.push_message(strategy.fe_id, json.dumps(message))
-        strategy.shift_start_timestamp = time.time()
+        strategy.shift_start_timestamp = get_clock().time()
         strategy.checking_shift_delay = True
         shift_happend = False
     
     if strategy.checking_shift_delay:
-        if time.time() - strategy.shift_start_timestamp >= strategy.shift_delay:
+        if get_clock().time() - strategy.shift_start_timestamp >= strategy.shift_delay:
             strategy.checking_shift_delay = False
             strategy.shift_start_timestamp = None
             shift_happend = True
@@ -18,6 +18,12 @@ class NotSupportedError(SystemDefinedError):
         self.message = message
         super().__init__(self.code, message)
 
+class ConfigurationError(SystemDefinedError):
+    def __init__(self, message: str = "Invalid configuration"):
+        self.code = 9017
+        self.message = message
+        super().__init__(self.code, message)
+
 class BrokerError(SystemDefinedError):
     def __init__(self, message: str = "Error in broker"):
         self.code = 9081
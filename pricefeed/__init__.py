@@ -1,168 +1,338 @@
 import logging
-from queue import Queue
-import time
+from functools import partial
+from queue import Empty
+from typing import Dict, Iterable
 from kiteconnect import KiteTicker
+from commons.clock import SimulatedClock, epoch_of_time_int, get_clock
 from commons.constants import MARKET_START_TIME
+from commons.enums import BrokerType, StreamMode
 from commons.utils import get_current_time_int
-from data import instruments, Cache
-from commons.models import Ohlc, Instrument
+from data import routes, TokenRoute
+from commons.models import Ohlc
 from config import Config
+from errors.system_defined import ConfigurationError
+from pricefeed.tickbook import TickBook
+from pricefeed.stream import ConflatingQueue, StreamQueue
+from pricefeed.window import StrikeWindow
+from pricefeed.shards import FeedShard, FirstArrivalFilter, ShardPool
+from pricefeed.monitor import StalenessMonitor
+from pricefeed.journal import TickJournal
+from pricefeed.replay import ReplayGate, ReplayTicker
+from pricefeed.bars import BAR_INTERVALS, BarBuilder
 
 logger = logging.getLogger(__name__)
 
-price_dict = {}
-option_chains = {}
-oi_dict = {}
-price_queue = Queue()
+NAN = float("nan")
+
+tick_book = TickBook()
+price_queue = (
+    ConflatingQueue() if Config.STREAM_MODE == StreamMode.CONFLATE else StreamQueue()
+)
+stream_tokens: Dict[int, int] = {}
+strike_window = StrikeWindow(Config.STRIKE_WINDOW, Config.STRIKE_WINDOW_LTP_OUTSIDE)
 previous_oi = {}
-last_heart_beat = time.time()
+last_heart_beat = 0.0
 count = 0
-all_connections: list[KiteTicker] = []
+feed_pool = ShardPool(
+    Config.PRICEFEED_CONNECTIONS,
+    Config.PRICEFEED_TOKENS_PER_CONNECTION,
+    2 if Config.PRICEFEED_REDUNDANT else 1,
+)
+first_arrival = FirstArrivalFilter() if Config.PRICEFEED_REDUNDANT else None
+staleness_monitor = StalenessMonitor(tick_book, feed_pool, Config.SHARD_STALE_SECONDS)
+# a replay must never append to the journal it is reading
+tick_journal = (
+    TickJournal(Config.TICK_JOURNAL_DIR) if Config.TICK_JOURNAL_DIR and not Config.REPLAY_FILE else None
+)
+bar_builder = BarBuilder(BAR_INTERVALS, Config.BAR_CAPACITY)
+replay_gate: ReplayGate = None
 
 
 def connect():
-    pricefeed_connection = KiteTicker(
-        api_key=Config.PRICEFEED_API_KEY,
-        access_token=Config.PRICEFEED_ACCESS_TOKEN,
-        debug=False,
-        root=None,
-        reconnect=True,
-        reconnect_max_tries=100,
-        reconnect_max_delay=5,
-        connect_timeout=10,
-    )
-    all_connections.append(pricefeed_connection)
-    pricefeed_connection.on_connect = on_connect
-    pricefeed_connection.on_ticks = on_ticks
-    pricefeed_connection.on_close = on_close
-    pricefeed_connection.on_error = or_error
-    pricefeed_connection.on_reconnect = on_reconnect
+    global replay_gate
+    if tick_journal is not None:
+        tick_journal.start()
+    if Config.REPLAY_FILE and isinstance(get_clock(), SimulatedClock):
+        replay_gate = ReplayGate(get_clock())
+    for shard in feed_pool:
+        connect_shard(shard)
+
+
+def connect_shard(shard: FeedShard):
+    if Config.REPLAY_FILE:
+        if Config.BROKER != BrokerType.DUMMY.name:
+            raise ConfigurationError(f"Replay needs the {BrokerType.DUMMY.name} broker, not {Config.BROKER}")
+        pricefeed_connection = ReplayTicker(Config.REPLAY_FILE, Config.REPLAY_SPEED, replay_gate)
+    else:
+        pricefeed_connection = KiteTicker(
+            api_key=Config.PRICEFEED_API_KEY,
+            access_token=Config.PRICEFEED_ACCESS_TOKEN,
+            debug=False,
+            root=None,
+            reconnect=True,
+            reconnect_max_tries=100,
+            reconnect_max_delay=5,
+            connect_timeout=10,
+        )
+    shard.connection = pricefeed_connection
+    pricefeed_connection.on_connect = partial(on_connect, shard)
+    pricefeed_connection.on_ticks = partial(on_ticks, shard)
+    pricefeed_connection.on_close = partial(on_close, shard)
+    pricefeed_connection.on_error = partial(or_error, shard)
+    pricefeed_connection.on_reconnect = partial(on_reconnect, shard)
     pricefeed_connection.connect(threaded=True)
 
 
+def close_shard(shard: FeedShard):
+    if shard.connection is not None:
+        shard.connection.close()
+    shard.connection = None
+    shard.connected = False
+    shard.reconnects += 1
+
+
+def reconnect_shards(shards: Iterable[FeedShard]):
+    if Config.REPLAY_FILE:
+        return
+    for shard in shards:
+        logger.info(f"Trying to reconnect shard {shard.index}/{shard.replica}.")
+        close_shard(shard)
+        connect_shard(shard)
+
+
+def get_feed_health():
+    return [shard.health() for shard in feed_pool]
+
+
+def watch_token(token: int, threshold: float = Config.STALE_TOKEN_SECONDS):
+    staleness_monitor.watch(token, threshold)
+
+
+def on_stale_token(token: int, age: float):
+    logger.warning(f"No tick for token {token} in {round(age, 1)}s")
+    reconnect_shards(feed_pool.token_shards.get(token, []))
+
+
+def on_stale_shard(shard: FeedShard, idle: float):
+    logger.warning(f"No tick on shard {shard.index}/{shard.replica} in {round(idle, 1)}s")
+    reconnect_shards([shard])
+
+
 def get_option_chain(underlying: str, expiry: str):
-    return option_chains[underlying][expiry]
+    return tick_book.get_option_chain(underlying, expiry)
+
+
+def get_option_chain_arrays(underlying: str, expiry: str, option_type: str):
+    return tick_book.get_chain(underlying, expiry, option_type)
+
+
+def get_open_interest(underlying: str, expiry: str, option_type: str):
+    return tick_book.get_oi(underlying, expiry, option_type)
 
 
 def get_quote(instrument_id: str):
-    return price_dict.get(instrument_id)
+    return tick_book.get_ltp(instrument_id)
 
 
 def get_quote_from_stream():
     return price_queue.get()
 
 
-def on_reconnect(_, attempts_count):
-    logger.error(f"attempts: {attempts_count}")
+def get_ticks_from_stream(timeout=None):
+    if replay_gate is None:
+        return price_queue.get_batch(timeout)
+    # timeouts are simulated seconds, and the replay waits for the engine to come back here
+    until_ns = None if timeout is None else get_clock().time_ns() + int(timeout * 1e9)
+    if not replay_gate.wait(lambda: price_queue.qsize() > 0, until_ns):
+        raise Empty
+    return price_queue.get_batch(0)
+
+
+def idle(seconds: float):
+    if replay_gate is None:
+        get_clock().sleep(seconds)
+        return
+    replay_gate.wait(lambda: False, get_clock().time_ns() + int(seconds * 1e9))
+
+
+def replay_finished() -> bool:
+    return replay_gate is not None and replay_gate.finished
+
+
+def get_stream_stats():
+    return price_queue.stats()
 
 
-def or_error(_, code, reason):
-    logger.error(f"{code}:: {reason}")
+def get_bars(token: int, interval: int = 60, count: int = 1):
+    return bar_builder.latest(int(token), interval, count)
 
 
-def on_connect(pricefeed_connection: KiteTicker, _):
-    logger.info("Feed connected successfully.")
-    tokens_to_subscribe = [
-        int(instrument.pricefeed_token) for instrument in instruments
-    ]
-    if len(instruments) > 0:
+def get_bar_range(token: int, start_int: int, end_int: int, interval: int = 60):
+    now_second = int(get_clock().time())
+    return bar_builder.range_between(
+        int(token),
+        interval,
+        epoch_of_time_int(start_int, now_second),
+        epoch_of_time_int(end_int, now_second),
+    )
+
+
+def subscribe_stream(tokens: Iterable[int]):
+    for token in tokens:
+        token = int(token)
+        stream_tokens[token] = stream_tokens.get(token, 0) + 1
+        bar_builder.track(token)
+
+
+def unsubscribe_stream(tokens: Iterable[int]):
+    for token in tokens:
+        token = int(token)
+        if token not in stream_tokens:
+            continue
+        stream_tokens[token] -= 1
+        if stream_tokens[token] <= 0:
+            del stream_tokens[token]
+
+
+def on_reconnect(shard: FeedShard, _, attempts_count):
+    shard.connected = False
+    logger.error(f"shard {shard.index}/{shard.replica} attempts: {attempts_count}")
+
+
+def or_error(shard: FeedShard, _, code, reason):
+    logger.error(f"shard {shard.index}/{shard.replica} {code}:: {reason}")
+
+
+def on_connect(shard: FeedShard, pricefeed_connection: KiteTicker, _):
+    logger.info(f"Feed shard {shard.index}/{shard.replica} connected successfully.")
+    shard.connected = True
+    shard.connected_ns = get_clock().time_ns()
+    if strike_window.enabled:
+        full_tokens, ltp_tokens = strike_window.initial_modes()
+        full_tokens &= shard.tokens
+        ltp_tokens &= shard.tokens
+    else:
+        full_tokens = set(shard.tokens)
+        ltp_tokens = set()
+    tokens_to_subscribe = list(full_tokens | ltp_tokens)
+    if len(tokens_to_subscribe) > 0:
         pricefeed_connection.subscribe(tokens_to_subscribe)
         pricefeed_connection.set_mode(
-            pricefeed_connection.MODE_FULL, tokens_to_subscribe
+            pricefeed_connection.MODE_FULL, list(full_tokens)
+        )
+        if ltp_tokens:
+            pricefeed_connection.set_mode(
+                pricefeed_connection.MODE_LTP, list(ltp_tokens)
+            )
+        logger.info(
+            f"Succesfully subscribed {len(tokens_to_subscribe)} tokens, {len(full_tokens)} in full mode."
         )
-        logger.info(f"Succesfully subscribed {len(tokens_to_subscribe)} tokens.")
 
 
-def on_ticks(_, ticks: dict):
+def shift_window(entering: set, leaving: set):
+    for shard, tokens in feed_pool.split(entering).items():
+        if not shard.connected:
+            continue
+        if not strike_window.ltp_outside:
+            shard.connection.subscribe(list(tokens))
+        shard.connection.set_mode(shard.connection.MODE_FULL, list(tokens))
+    for shard, tokens in feed_pool.split(leaving).items():
+        if not shard.connected:
+            continue
+        if strike_window.ltp_outside:
+            shard.connection.set_mode(shard.connection.MODE_LTP, list(tokens))
+        else:
+            shard.connection.unsubscribe(list(tokens))
+    logger.debug(f"Strike window shifted: +{len(entering)} -{len(leaving)} tokens")
+
+
+def pin_tokens(tokens: Iterable[int]):
+    entering = strike_window.pin({int(token) for token in tokens})
+    if strike_window.enabled and entering:
+        shift_window(entering, set())
+
+
+def on_ticks(shard: FeedShard, _, ticks: dict):
     global last_heart_beat, count
+    received_ns = get_clock().time_ns()
+    shard.on_ticks(len(ticks), received_ns)
     for pkt in ticks:
         try:
+            instrument_token = pkt["instrument_token"]
+            route: TokenRoute = routes.get(instrument_token)
+            if route is None:
+                continue
+            if first_arrival is not None and not first_arrival.accept(pkt, shard.replica):
+                continue
+            ltp = pkt["last_price"]
+
             if "depth" in pkt:
-                ask_price = pkt["depth"]["buy"][0]["price"]
-                bid_price = pkt["depth"]["sell"][0]["price"]
+                bid_price = pkt["depth"]["buy"][0]["price"]
+                ask_price = pkt["depth"]["sell"][0]["price"]
                 volume_traded = pkt["volume_traded"]
                 open_interest = pkt["oi"]
+                if (ask_price == 0) or (bid_price == 0) or (volume_traded == 0):
+                    continue
+                tick_book.update(
+                    route.slot,
+                    ltp,
+                    bid_price,
+                    ask_price,
+                    volume_traded,
+                    open_interest,
+                    received_ns,
+                )
             else:
-                # for indices
-                ask_price = 1
-                bid_price = 1
-                volume_traded = 1
-                open_interest = 1
-
-            if (ask_price != 0) and (bid_price != 0) and (volume_traded != 0):
-                instrument_token = pkt["instrument_token"]
-                ltp = pkt["last_price"]
-                ohlc = Ohlc(instrument_token, ltp)
-                price_dict[instrument_token] = ltp
-                instrument: Instrument = Cache().pull(instrument_token)
-                if instrument.underlying.name not in oi_dict:
-                    oi_dict[instrument.underlying.name] = {}
-                if (
-                    instrument.expiry_date.strftime("%Y-%m-%d")
-                    not in oi_dict[instrument.underlying.name]
-                ):
-                    oi_dict[instrument.underlying.name][
-                        instrument.expiry_date.strftime("%Y-%m-%d")
-                    ] = {}
-                if (
-                    instrument.option_type.name
-                    not in oi_dict[instrument.underlying.name][
-                        instrument.expiry_date.strftime("%Y-%m-%d")
-                    ]
-                ):
-                    oi_dict[instrument.underlying.name][
-                        instrument.expiry_date.strftime("%Y-%m-%d")][
-                        instrument.option_type.name] = {}
-                oi_dict[instrument.underlying.name][
-                    instrument.expiry_date.strftime("%Y-%m-%d")][
-                    instrument.option_type.name][instrument] = int(open_interest/instrument.lot_size)
-
-                if instrument.underlying.name not in option_chains:
-                    option_chains[instrument.underlying.name] = {}
-                if (
-                    instrument.expiry_date.strftime("%Y-%m-%d")
-                    not in option_chains[instrument.underlying.name]
-                ):
-                    option_chains[instrument.underlying.name][
-                        instrument.expiry_date.strftime("%Y-%m-%d")
-                    ] = {}
-                if (
-                    instrument.option_type.name
-                    not in option_chains[instrument.underlying.name][
-                        instrument.expiry_date.strftime("%Y-%m-%d")
-                    ]
-                ):
-                    option_chains[instrument.underlying.name][
-                        instrument.expiry_date.strftime("%Y-%m-%d")
-                    ][instrument.option_type.name] = {}
-
-                option_chains[instrument.underlying.name][
-                    instrument.expiry_date.strftime("%Y-%m-%d")
-                ][instrument.option_type.name][instrument.strike_price] = ltp
-                count += 1
-                price_queue.put(ohlc)
+                # for indices and options streamed in ltp mode
+                bid_price = ask_price = NAN
+                volume_traded = open_interest = 0
+                tick_book.update_ltp(route.slot, ltp, received_ns)
+
+            bar_builder.update(instrument_token, ltp, volume_traded, received_ns)
+
+            if tick_journal is not None:
+                tick_journal.record(
+                    instrument_token,
+                    pkt.get("exchange_timestamp"),
+                    received_ns,
+                    ltp,
+                    bid_price,
+                    ask_price,
+                    volume_traded,
+                    open_interest,
+                )
+
+            count += 1
+            if instrument_token in stream_tokens:
+                price_queue.put(Ohlc(instrument_token, ltp, received_ns))
+            if instrument_token in strike_window.underlying_tokens:
+                window_change = strike_window.on_underlying_tick(instrument_token, ltp)
+                if window_change:
+                    shift_window(*window_change)
         except Exception:
             logger.exception(f"Feed disconnected, {pkt}")
 
 
 def heartbeat():
     global last_heart_beat, count
+    staleness_monitor.on_stale_token(on_stale_token)
+    staleness_monitor.on_stale_shard(on_stale_shard)
+    while get_current_time_int() <= MARKET_START_TIME:
+        get_clock().sleep(1)
+    staleness_monitor.started_ns = get_clock().time_ns()
+    last_heart_beat = get_clock().time()
     while True:
-        if get_current_time_int() <= MARKET_START_TIME:
-            time.sleep(1)
-            continue
-        if time.time()-last_heart_beat>=10:
-            if count == 0:
-                logger.info(f"Trying to reconnect.")
-                for prc_conn in all_connections:
-                    prc_conn.close()
-                all_connections.clear()
-                connect()
-            else:
-                logger.debug(f"HEARTBEAT:: {count}")
-                count = 0
-            last_heart_beat = time.time()
-        time.sleep(0.1)
+        next_check = staleness_monitor.check(get_clock().time_ns())
+        if get_clock().time()-last_heart_beat>=10:
+            logger.debug(f"HEARTBEAT:: {count}, STREAM:: {get_stream_stats()}")
+            logger.debug(f"FEED:: {get_feed_health()}")
+            if first_arrival is not None:
+                logger.debug(f"DUPLICATES:: {first_arrival.duplicates}")
+            count = 0
+            last_heart_beat = get_clock().time()
+        staleness_monitor.wait(min(next_check, 10 - (get_clock().time()-last_heart_beat)))
+
 
-def on_close(_, code, reason):
-    logger.critical(f"Closed feed with code={code}, reason={reason}")
+def on_close(shard: FeedShard, _, code, reason):
+    shard.connected = False
+    logger.critical(f"Closed feed shard {shard.index}/{shard.replica} with code={code}, reason={reason}")
@@ -0,0 +1,121 @@
+import threading
+from typing import Dict, Iterable
+import numpy as np
+
+BAR_INTERVALS = (1, 60, 300)
+
+
+class BarSeries:
+    def __init__(self, interval: int, capacity: int):
+        self.interval = interval
+        self.capacity = capacity
+        self.rows: Dict[int, int] = {}
+        self.start = np.zeros((0, capacity), dtype=np.int64)
+        self.open = np.zeros((0, capacity))
+        self.high = np.zeros((0, capacity))
+        self.low = np.zeros((0, capacity))
+        self.close = np.zeros((0, capacity))
+        self.volume = np.zeros((0, capacity), dtype=np.int64)
+        self.heads = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def track(self, token: int) -> int:
+        row = self.rows.get(token)
+        if row is not None:
+            return row
+        row = self.rows[token] = len(self.rows)
+        self.start = np.vstack((self.start, np.full(self.capacity, -1, dtype=np.int64)))
+        self.open = np.vstack((self.open, np.full(self.capacity, np.nan)))
+        self.high = np.vstack((self.high, np.full(self.capacity, np.nan)))
+        self.low = np.vstack((self.low, np.full(self.capacity, np.nan)))
+        self.close = np.vstack((self.close, np.full(self.capacity, np.nan)))
+        self.volume = np.vstack((self.volume, np.zeros(self.capacity, dtype=np.int64)))
+        self.heads = np.append(self.heads, -1)
+        self.counts = np.append(self.counts, 0)
+        return row
+
+    def update(self, row: int, second: int, ltp: float, volume: int):
+        bar_start = second - second % self.interval
+        head = self.heads[row]
+        if head < 0 or bar_start > self.start[row, head]:
+            head = self.heads[row] = (head + 1) % self.capacity
+            self.counts[row] = min(self.counts[row] + 1, self.capacity)
+            self.start[row, head] = bar_start
+            self.open[row, head] = self.high[row, head] = self.low[row, head] = ltp
+            self.close[row, head] = ltp
+            self.volume[row, head] = volume
+            return
+        if bar_start < self.start[row, head]:
+            return
+        if ltp > self.high[row, head]:
+            self.high[row, head] = ltp
+        if ltp < self.low[row, head]:
+            self.low[row, head] = ltp
+        self.close[row, head] = ltp
+        self.volume[row, head] += volume
+
+    def latest(self, token: int, count: int) -> Dict[str, np.ndarray]:
+        row = self.rows.get(token)
+        if row is None:
+            return None
+        count = min(count, self.counts[row])
+        positions = (self.heads[row] - np.arange(count - 1, -1, -1)) % self.capacity
+        return {
+            "start": self.start[row, positions],
+            "open": self.open[row, positions],
+            "high": self.high[row, positions],
+            "low": self.low[row, positions],
+            "close": self.close[row, positions],
+            "volume": self.volume[row, positions],
+        }
+
+    def range_between(self, token: int, start_second: int, end_second: int):
+        row = self.rows.get(token)
+        if row is None:
+            return None
+        if self.counts[row] == self.capacity:
+            oldest = (self.heads[row] + 1) % self.capacity
+            if self.start[row, oldest] > start_second - start_second % self.interval:
+                # the ring has already evicted bars from the start of the range
+                return None
+        # only bars that close inside the range, a bar starting at end_second runs past it
+        mask = (self.start[row] >= start_second) & (self.start[row] + self.interval - 1 <= end_second)
+        if not mask.any():
+            return None
+        return float(self.high[row, mask].max()), float(self.low[row, mask].min())
+
+
+class BarBuilder:
+    def __init__(self, intervals: Iterable[int], capacity: int):
+        self.series: Dict[int, BarSeries] = {
+            interval: BarSeries(interval, capacity) for interval in intervals
+        }
+        self.tokens: Dict[int, int] = {}
+        self.last_volume: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def track(self, token: int):
+        with self._lock:
+            for series in self.series.values():
+                self.tokens[token] = series.track(token)
+
+    def update(self, token: int, ltp: float, volume_traded: int, received_ns: int):
+        row = self.tokens.get(token)
+        if row is None:
+            return
+        second = received_ns // 1_000_000_000
+        with self._lock:
+            volume = 0
+            if volume_traded:
+                volume = max(volume_traded - self.last_volume.get(token, volume_traded), 0)
+                self.last_volume[token] = volume_traded
+            for series in self.series.values():
+                series.update(row, second, ltp, volume)
+
+    def latest(self, token: int, interval: int, count: int):
+        with self._lock:
+            return self.series[interval].latest(token, count)
+
+    def range_between(self, token: int, interval: int, start_second: int, end_second: int):
+        with self._lock:
+            return self.series[interval].range_between(token, start_second, end_second)
@@ -0,0 +1,98 @@
+import os
+import logging
+from datetime import date, datetime
+from typing import Optional, Tuple
+import numpy as np
+import pandas as pd
+import pytz
+from kiteconnect import KiteConnect
+from commons.clock import epoch_of_time_int, get_clock, time_int_of, time_int_to_seconds
+from config import Config
+from pricefeed import bar_builder
+from pricefeed.journal import journal_path, read_journal, trading_day_of
+
+logger = logging.getLogger(__name__)
+
+IST = pytz.timezone("Asia/Kolkata")
+
+
+def journal_range(directory: str, token: int, start_ns: int, end_ns: int):
+    path = journal_path(directory, trading_day_of(start_ns))
+    if not os.path.exists(path):
+        return None
+    records = read_journal(path)
+    mask = (
+        (records["token"] == token)
+        & (records["received_ns"] >= start_ns)
+        & (records["received_ns"] <= end_ns)
+    )
+    ltps = records["ltp"][mask]
+    ltps = ltps[~np.isnan(ltps)]
+    if not len(ltps):
+        return None
+    return float(ltps.max()), float(ltps.min())
+
+
+def bars_path(directory: str, token: int, trading_day: date) -> str:
+    return os.path.join(directory, f"{token}_{trading_day.strftime('%Y%m%d')}.csv")
+
+
+def file_bars_range(directory: str, token: int, trading_day: date, start_int: int, end_int: int):
+    path = bars_path(directory, token, trading_day)
+    if not os.path.exists(path):
+        return None
+    bars = pd.read_csv(path, usecols=["time", "high", "low"])
+    bar_ends = bars["time"].map(time_int_to_seconds) + 59
+    bars = bars[(bars["time"] >= start_int) & (bar_ends <= time_int_to_seconds(end_int))]
+    if bars.empty:
+        return None
+    return float(bars["high"].max()), float(bars["low"].min())
+
+
+def kite_bars_range(token: int, start: datetime, end: datetime):
+    kite = KiteConnect(api_key=Config.PRICEFEED_API_KEY)
+    kite.set_access_token(Config.PRICEFEED_ACCESS_TOKEN)
+    bars = kite.historical_data(token, start, end, "minute")
+    if not bars:
+        return None
+    return max(bar["high"] for bar in bars), min(bar["low"] for bar in bars)
+
+
+def prefill_range(token: int, start_int: int, end_int: int) -> Optional[Tuple[float, float]]:
+    now_second = int(get_clock().time())
+    end_int = min(end_int, time_int_of(now_second))
+    start_second = epoch_of_time_int(start_int, now_second)
+    end_second = epoch_of_time_int(end_int, now_second)
+    if end_second < start_second:
+        return None
+
+    # the journal and 1s bars are exact, minute bars only approximate the range
+    exact = None
+    if Config.TICK_JOURNAL_DIR:
+        exact = journal_range(Config.TICK_JOURNAL_DIR, token, start_second * 10**9, end_second * 10**9 + 999_999_999)
+    if exact is None:
+        exact = bar_builder.range_between(token, 1, start_second, end_second)
+    if exact is not None:
+        return exact
+
+    found = [bar_builder.range_between(token, 60, start_second, end_second)]
+    if Config.HISTORY_BARS_DIR:
+        trading_day = datetime.fromtimestamp(start_second, IST).date()
+        found.append(file_bars_range(Config.HISTORY_BARS_DIR, token, trading_day, start_int, end_int))
+    if Config.HISTORY_FROM_KITE:
+        try:
+            found.append(
+                kite_bars_range(
+                    token,
+                    datetime.fromtimestamp(start_second, IST).replace(tzinfo=None),
+                    # candles are stamped with their start, keep the last one inside the range
+                    datetime.fromtimestamp(end_second - 59, IST).replace(tzinfo=None),
+                )
+            )
+        except Exception as ex:
+            logger.warning(f"Unable to fetch historical bars for {token}: {ex}")
+
+    found = [item for item in found if item is not None]
+    if not found:
+        return None
+    return max(high for high, _ in found), min(low for _, low in found)
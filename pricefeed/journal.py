@@ -0,0 +1,94 @@
+import os
+import logging
+import threading
+from datetime import date, datetime
+from queue import Empty, SimpleQueue
+import numpy as np
+import pytz
+
+logger = logging.getLogger(__name__)
+
+RECORD_DTYPE = np.dtype(
+    [
+        ("token", "<i8"),
+        ("exchange_ns", "<i8"),
+        ("received_ns", "<i8"),
+        ("ltp", "<f8"),
+        ("bid", "<f8"),
+        ("ask", "<f8"),
+        ("volume", "<i8"),
+        ("oi", "<i8"),
+    ]
+)
+
+
+def journal_path(directory: str, trading_day: date) -> str:
+    return os.path.join(directory, f"ticks_{trading_day.strftime('%Y%m%d')}.bin")
+
+
+def trading_day_of(timestamp_ns: int) -> date:
+    return datetime.fromtimestamp(timestamp_ns / 1e9, pytz.timezone("Asia/Kolkata")).date()
+
+
+def read_journal(path: str) -> np.ndarray:
+    record_count = os.path.getsize(path) // RECORD_DTYPE.itemsize
+    if record_count == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(record_count,))
+
+
+class TickJournal:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.written = 0
+        self._pending = SimpleQueue()
+        self._thread: threading.Thread = None
+        self._file = None
+        self._day: date = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="tick-journal", daemon=True)
+        self._thread.start()
+
+    def record(self, token, exchange_timestamp, received_ns, ltp, bid, ask, volume, oi):
+        self._pending.put((token, exchange_timestamp, received_ns, ltp, bid, ask, volume, oi))
+
+    def _run(self):
+        while True:
+            pending = [self._pending.get()]
+            while True:
+                try:
+                    pending.append(self._pending.get_nowait())
+                except Empty:
+                    break
+            try:
+                self._write(pending)
+            except Exception:
+                logger.exception(f"Unable to journal {len(pending)} ticks")
+
+    def _write(self, pending: list):
+        records = np.empty(len(pending), dtype=RECORD_DTYPE)
+        for index, (token, exchange_timestamp, received_ns, ltp, bid, ask, volume, oi) in enumerate(pending):
+            exchange_ns = int(exchange_timestamp.timestamp() * 1e9) if exchange_timestamp else 0
+            records[index] = (token, exchange_ns, received_ns, ltp, bid, ask, volume, oi)
+
+        trading_day = trading_day_of(int(records["received_ns"][0]))
+        if trading_day != self._day:
+            if self._file is not None:
+                self._file.close()
+            path = journal_path(self.directory, trading_day)
+            if os.path.exists(path):
+                size = os.path.getsize(path)
+                torn = size % RECORD_DTYPE.itemsize
+                if torn:
+                    # a crash mid-write leaves a partial record that would misalign every later one
+                    logger.warning(f"Dropping {torn} byte torn record at the end of {path}")
+                    os.truncate(path, size - torn)
+            self._file = open(path, "ab")
+            self._day = trading_day
+        self._file.write(records.tobytes())
+        self._file.flush()
+        self.written += len(records)
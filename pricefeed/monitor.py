@@ -0,0 +1,69 @@
+import threading
+from typing import Callable, Dict, List
+from commons.clock import get_clock
+from pricefeed.tickbook import TickBook
+from pricefeed.shards import FeedShard, ShardPool
+
+
+class StalenessMonitor:
+    def __init__(self, tick_book: TickBook, feed_pool: ShardPool, shard_timeout: float):
+        self.tick_book = tick_book
+        self.feed_pool = feed_pool
+        self.shard_timeout = shard_timeout
+        self.watched: Dict[int, float] = {}
+        self.stale_tokens: Dict[int, int] = {}
+        self.token_listeners: List[Callable[[int, float], None]] = []
+        self.shard_listeners: List[Callable[[FeedShard, float], None]] = []
+        self.started_ns = get_clock().time_ns()
+        self._wakeup = threading.Event()
+
+    def watch(self, token: int, threshold: float):
+        self.watched[int(token)] = threshold
+        self._wakeup.set()
+
+    def unwatch(self, token: int):
+        self.watched.pop(int(token), None)
+        self.stale_tokens.pop(int(token), None)
+
+    def on_stale_token(self, listener: Callable[[int, float], None]):
+        self.token_listeners.append(listener)
+
+    def on_stale_shard(self, listener: Callable[[FeedShard, float], None]):
+        self.shard_listeners.append(listener)
+
+    def token_age(self, token: int, now_ns: int) -> float:
+        route = self.tick_book.routes.get(token)
+        last_update_ns = self.tick_book.updated_ns[route.slot] if route else 0
+        return (now_ns - max(int(last_update_ns), self.started_ns)) / 1e9
+
+    def check(self, now_ns: int) -> float:
+        next_check = self.shard_timeout
+        for token, threshold in list(self.watched.items()):
+            age = self.token_age(token, now_ns)
+            if age < threshold:
+                self.stale_tokens.pop(token, None)
+                next_check = min(next_check, threshold - age)
+                continue
+            fired_ns = self.stale_tokens.get(token)
+            since_fired = (now_ns - fired_ns) / 1e9 if fired_ns else threshold
+            if since_fired >= threshold:
+                self.stale_tokens[token] = now_ns
+                for listener in self.token_listeners:
+                    listener(token, age)
+                since_fired = 0
+            next_check = min(next_check, threshold - since_fired)
+
+        for shard in self.feed_pool:
+            if not shard.connected:
+                continue
+            idle = (now_ns - max(shard.last_tick_ns, shard.connected_ns, self.started_ns)) / 1e9
+            if idle >= self.shard_timeout:
+                for listener in self.shard_listeners:
+                    listener(shard, idle)
+                continue
+            next_check = min(next_check, self.shard_timeout - idle)
+        return max(next_check, 0.01)
+
+    def wait(self, timeout: float):
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
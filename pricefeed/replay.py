@@ -0,0 +1,196 @@
+import time
+import logging
+import threading
+from datetime import datetime
+from functools import partial
+from typing import Callable, Dict, Iterable, Optional
+import numpy as np
+from commons.clock import SimulatedClock
+from pricefeed.journal import read_journal
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayGate:
+    """Steps replay feeds in timestamp order, one batch at a time, and only
+    once the engine has finished with the previous batch."""
+
+    def __init__(self, clock: SimulatedClock):
+        self.clock = clock
+        self.finished = False
+        self._pending: Dict[int, Optional[int]] = {}
+        self._joined = 0
+        self._steps = 0
+        self._settled = -1
+        self._turn = threading.Condition()
+
+    def join(self) -> int:
+        with self._turn:
+            feed = self._joined
+            self._joined += 1
+            self._pending[feed] = None
+            return feed
+
+    def leave(self, feed: int):
+        with self._turn:
+            self._pending.pop(feed, None)
+            if not self._pending:
+                self.finished = True
+            self._turn.notify_all()
+
+    def _is_turn(self, feed: int, timestamp_ns: int) -> bool:
+        if self._settled < self._steps or None in self._pending.values():
+            return False
+        return min((ts, other) for other, ts in self._pending.items()) == (timestamp_ns, feed)
+
+    def step(self, feed: int, timestamp_ns: int, deliver: Callable[[], None]):
+        with self._turn:
+            self._pending[feed] = timestamp_ns
+            self._turn.notify_all()
+            self._turn.wait_for(lambda: self._is_turn(feed, timestamp_ns))
+            self.clock.advance_to(timestamp_ns)
+            try:
+                deliver()
+            finally:
+                self._steps += 1
+                self._pending[feed] = None
+                self._turn.notify_all()
+
+    def wait(self, ready: Callable[[], bool], until_ns: int = None) -> bool:
+        with self._turn:
+            while True:
+                if ready():
+                    return True
+                if self.finished or (until_ns is not None and self.clock.time_ns() >= until_ns):
+                    return False
+                # the engine is idle, let the next batch through
+                self._settled = self._steps
+                self._turn.notify_all()
+                self._turn.wait()
+
+
+class ReplayTicker:
+    MODE_FULL = "full"
+    MODE_QUOTE = "quote"
+    MODE_LTP = "ltp"
+
+    def __init__(self, path: str, speed: float = 1, gate: ReplayGate = None):
+        self.path = path
+        self.speed = speed
+        self.gate = gate
+        self.feed: int = None
+        self.records: np.ndarray = None
+        self.modes: Dict[int, str] = {}
+        self.delivered = 0
+        self.on_connect = None
+        self.on_ticks = None
+        self.on_close = None
+        self.on_error = None
+        self.on_reconnect = None
+        self._connected = False
+        self._stopped = threading.Event()
+        self._thread: threading.Thread = None
+
+    def connect(self, threaded=False, **kwargs):
+        self.records = read_journal(self.path)
+        if self.gate is not None:
+            self.feed = self.gate.join()
+            # start the clock before the engine reads it, not whenever the feed thread runs
+            if len(self.records):
+                self.gate.clock.advance_to(int(self.records["received_ns"][0]))
+        if threaded:
+            self._thread = threading.Thread(target=self._run, name="replay-feed", daemon=True)
+            self._thread.start()
+        else:
+            self._run()
+
+    def close(self, code=None, reason=None):
+        self._stopped.set()
+
+    def stop(self):
+        self.close()
+
+    def is_connected(self):
+        return self._connected
+
+    def subscribe(self, instrument_tokens: Iterable[int]):
+        for token in instrument_tokens:
+            self.modes.setdefault(int(token), self.MODE_QUOTE)
+        return True
+
+    def unsubscribe(self, instrument_tokens: Iterable[int]):
+        for token in instrument_tokens:
+            self.modes.pop(int(token), None)
+        return True
+
+    def set_mode(self, mode: str, instrument_tokens: Iterable[int]):
+        for token in instrument_tokens:
+            self.modes[int(token)] = mode
+        return True
+
+    def packet(self, record: tuple, mode: str) -> dict:
+        token, exchange_ns, _, ltp, bid, ask, volume, oi = record
+        pkt = {
+            "tradable": True,
+            "mode": mode,
+            "instrument_token": token,
+            "last_price": ltp,
+        }
+        if mode == self.MODE_LTP or np.isnan(bid):
+            return pkt
+        pkt["volume_traded"] = volume
+        pkt["oi"] = oi
+        pkt["depth"] = {"buy": [{"price": bid}], "sell": [{"price": ask}]}
+        if exchange_ns:
+            pkt["exchange_timestamp"] = datetime.fromtimestamp(exchange_ns / 1e9)
+        return pkt
+
+    def _run(self):
+        records = self.records
+        started = time.perf_counter()
+        try:
+            self._connected = True
+            if self.on_connect:
+                self.on_connect(self, {})
+            if len(records):
+                self._replay(records, started)
+        finally:
+            if self.gate is not None:
+                self.gate.leave(self.feed)
+        self._finish(time.perf_counter() - started)
+
+    def _replay(self, records: np.ndarray, started: float):
+        received_ns = records["received_ns"]
+        boundaries = np.flatnonzero(np.diff(received_ns)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(records)]))
+        first_ns = int(received_ns[0])
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            if self._stopped.is_set():
+                break
+            if self.speed > 0:
+                due = (int(received_ns[start]) - first_ns) / 1e9 / self.speed
+                delay = due - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            if self.gate is not None:
+                self.gate.step(self.feed, int(received_ns[start]), partial(self._deliver, records[start:end]))
+            else:
+                self._deliver(records[start:end])
+
+    def _deliver(self, batch: np.ndarray):
+        pkts = []
+        for record in batch.tolist():
+            mode = self.modes.get(record[0])
+            if mode is not None:
+                pkts.append(self.packet(record, mode))
+        if pkts and self.on_ticks:
+            self.on_ticks(self, pkts)
+            self.delivered += len(pkts)
+
+    def _finish(self, elapsed: float):
+        self._connected = False
+        rate = self.delivered / elapsed if elapsed else 0
+        logger.info(f"Replayed {self.delivered} ticks from {self.path} in {round(elapsed, 3)}s ({round(rate)} ticks/s)")
+        if self.on_close:
+            self.on_close(self, 1000, "Replay finished")
@@ -0,0 +1,127 @@
+import math
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Set, Tuple
+from kiteconnect import KiteTicker
+from commons.clock import get_clock
+from errors.system_defined import ConfigurationError
+
+# kite allows at most 3 websocket connections per api key
+MAX_TICKER_CONNECTIONS = 3
+
+
+class FeedShard:
+    def __init__(self, index: int, replica: int = 0):
+        self.index = index
+        self.replica = replica
+        self.connection: KiteTicker = None
+        self.tokens: Set[int] = set()
+        self.connected = False
+        self.ticks = 0
+        self.last_tick_ns = 0
+        self.connected_ns = 0
+        self.reconnects = 0
+
+    def on_ticks(self, tick_count: int, received_ns: int):
+        self.ticks += tick_count
+        self.last_tick_ns = received_ns
+
+    def health(self) -> dict:
+        idle = (get_clock().time_ns() - self.last_tick_ns) / 1e9 if self.last_tick_ns else None
+        return {
+            "shard": self.index,
+            "replica": self.replica,
+            "tokens": len(self.tokens),
+            "connected": self.connected,
+            "ticks": self.ticks,
+            "idle_seconds": idle,
+            "reconnects": self.reconnects,
+        }
+
+    def __str__(self):
+        return f"FeedShard(index={self.index}, replica={self.replica}, tokens={len(self.tokens)}, connected={self.connected})"
+
+
+class ShardPool:
+    def __init__(self, connections: int, tokens_per_connection: int, replicas: int = 1):
+        self.connections = connections
+        self.tokens_per_connection = tokens_per_connection
+        self.replicas = replicas
+        self.shards: List[FeedShard] = []
+        self.token_shards: Dict[int, List[FeedShard]] = {}
+
+    def allocate(self, tokens: Iterable[int]):
+        tokens = sorted({int(token) for token in tokens})
+        shard_count = max(
+            self.connections, math.ceil(len(tokens) / self.tokens_per_connection), 1
+        )
+        if shard_count * self.replicas > MAX_TICKER_CONNECTIONS:
+            raise ConfigurationError(
+                f"{len(tokens)} tokens need {shard_count} shards x {self.replicas} replicas, "
+                f"more than the {MAX_TICKER_CONNECTIONS} websocket connections allowed per api key"
+            )
+        self.shards = [
+            FeedShard(index, replica)
+            for index in range(shard_count)
+            for replica in range(self.replicas)
+        ]
+        self.token_shards.clear()
+        for position, token in enumerate(tokens):
+            index = position % shard_count
+            replicas = self.shards[index * self.replicas:(index + 1) * self.replicas]
+            for shard in replicas:
+                shard.tokens.add(token)
+            self.token_shards[token] = replicas
+
+    def split(self, tokens: Iterable[int]) -> Dict[FeedShard, Set[int]]:
+        grouped: Dict[FeedShard, Set[int]] = {}
+        for token in tokens:
+            for shard in self.token_shards.get(token, []):
+                grouped.setdefault(shard, set()).add(token)
+        return grouped
+
+    def __iter__(self):
+        return iter(self.shards)
+
+    def __len__(self):
+        return len(self.shards)
+
+
+class FirstArrivalFilter:
+    def __init__(self, window: int = 32):
+        self.window = window
+        self.last_seen: Dict[int, tuple] = {}
+        self.accepted: Dict[int, Deque[tuple]] = {}
+        self.seen: Dict[Tuple[int, int], Deque[tuple]] = {}
+        self.duplicates = 0
+        self._lock = threading.Lock()
+
+    def accept(self, pkt: dict, replica: int = 0) -> bool:
+        token = pkt["instrument_token"]
+        exchange_timestamp = pkt.get("exchange_timestamp")
+        marker = (
+            exchange_timestamp.timestamp() if exchange_timestamp else 0.0,
+            pkt.get("volume_traded", 0),
+            pkt["last_price"],
+            pkt.get("oi", 0),
+        )
+        with self._lock:
+            accepted = self.accepted.get(token)
+            if accepted is None:
+                accepted = self.accepted[token] = deque(maxlen=self.window)
+            seen = self.seen.get((token, replica))
+            if seen is None:
+                seen = self.seen[(token, replica)] = deque(maxlen=self.window)
+            seen.append(marker)
+
+            last = self.last_seen.get(token)
+            # ltp mode packets carry no timestamp and index packets no volume, so
+            # within an exchange second a replica's copy is only new if that replica
+            # has now seen the marker more often than it was accepted
+            stale = last is not None and marker[0] and last[0] and marker[:2] < last[:2]
+            if stale or seen.count(marker) <= accepted.count(marker):
+                self.duplicates += 1
+                return False
+            accepted.append(marker)
+            self.last_seen[token] = marker
+        return True
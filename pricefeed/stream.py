@@ -0,0 +1,134 @@
+import threading
+from collections import OrderedDict
+from queue import Queue, Empty
+from typing import Dict, List
+import numpy as np
+from commons.clock import get_clock
+from commons.models import Ohlc
+
+
+class TickBatch:
+    def __init__(self, items: List[Ohlc]):
+        count = len(items)
+        self.tokens = np.fromiter((item.token for item in items), dtype=np.int64, count=count)
+        self.ltps = np.fromiter((item.ltp for item in items), dtype=np.float64, count=count)
+        self.seqs = np.fromiter((item.seq for item in items), dtype=np.int64, count=count)
+        self.highs = np.fromiter((item.high for item in items), dtype=np.float64, count=count)
+        self.lows = np.fromiter((item.low for item in items), dtype=np.float64, count=count)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def summary(self, token: int):
+        mask = self.tokens == token
+        ltps = self.ltps[mask]
+        if not len(ltps):
+            return None
+        return float(ltps[-1]), float(self.highs[mask].max()), float(self.lows[mask].min())
+
+    def summaries(self) -> Dict[int, tuple]:
+        if not len(self.tokens):
+            return {}
+        order = np.argsort(self.tokens, kind="stable")
+        tokens = self.tokens[order]
+        ltps = self.ltps[order]
+        unique, starts = np.unique(tokens, return_index=True)
+        ends = np.append(starts[1:], len(tokens)) - 1
+        highs = np.maximum.reduceat(self.highs[order], starts)
+        lows = np.minimum.reduceat(self.lows[order], starts)
+        return {
+            token: (latest, high, low)
+            for token, latest, high, low in zip(
+                unique.tolist(), ltps[ends].tolist(), highs.tolist(), lows.tolist()
+            )
+        }
+
+
+class StreamMetrics:
+    def __init__(self):
+        self.sequences: Dict[int, int] = {}
+        self.drops = 0
+        self.last_lag_ns = 0
+        self.max_lag_ns = 0
+
+    def stamp(self, item: Ohlc):
+        seq = self.sequences.get(item.token, 0) + 1
+        self.sequences[item.token] = seq
+        item.seq = seq
+
+    def observe(self, item: Ohlc):
+        if item.received_ns:
+            self.last_lag_ns = get_clock().time_ns() - item.received_ns
+            self.max_lag_ns = max(self.max_lag_ns, self.last_lag_ns)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.qsize(),
+            "drops": self.drops,
+            "last_lag_ms": round(self.last_lag_ns / 1e6, 3),
+            "max_lag_ms": round(self.max_lag_ns / 1e6, 3),
+        }
+
+
+class StreamQueue(Queue, StreamMetrics):
+    def __init__(self):
+        Queue.__init__(self)
+        StreamMetrics.__init__(self)
+
+    def put(self, item: Ohlc, block=True, timeout=None):
+        self.stamp(item)
+        super().put(item, block, timeout)
+
+    def get(self, block=True, timeout=None) -> Ohlc:
+        item = super().get(block, timeout)
+        self.observe(item)
+        return item
+
+    def get_batch(self, timeout=None) -> TickBatch:
+        items = [self.get(True, timeout)]
+        while True:
+            try:
+                items.append(self.get_nowait())
+            except Empty:
+                break
+        return TickBatch(items)
+
+
+class ConflatingQueue(StreamMetrics):
+    def __init__(self):
+        super().__init__()
+        self._latest: "OrderedDict[int, Ohlc]" = OrderedDict()
+        self._ready = threading.Condition()
+
+    def put(self, item: Ohlc, block=True, timeout=None):
+        with self._ready:
+            self.stamp(item)
+            conflated = self._latest.get(item.token)
+            if conflated is not None:
+                self.drops += 1
+                # keep the extremes of the ticks folded into this slot
+                item.high = max(item.high, conflated.high)
+                item.low = min(item.low, conflated.low)
+            self._latest[item.token] = item
+            self._ready.notify()
+
+    def get(self, block=True, timeout=None) -> Ohlc:
+        with self._ready:
+            if not self._ready.wait_for(lambda: self._latest, timeout if block else 0):
+                raise Empty
+            _, item = self._latest.popitem(last=False)
+        self.observe(item)
+        return item
+
+    def get_batch(self, timeout=None) -> TickBatch:
+        with self._ready:
+            if not self._ready.wait_for(lambda: self._latest, timeout):
+                raise Empty
+            items = list(self._latest.values())
+            self._latest.clear()
+        for item in items:
+            self.observe(item)
+        return TickBatch(items)
+
+    def qsize(self) -> int:
+        return len(self._latest)
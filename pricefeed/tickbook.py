@@ -0,0 +1,90 @@
+from typing import Dict, Tuple
+import numpy as np
+from data.models import TokenRoute
+
+
+class ChainView:
+    def __init__(self, strikes: np.ndarray, slots: np.ndarray, lot_sizes: np.ndarray):
+        self.strikes = strikes
+        self.slots = slots
+        self.lot_sizes = lot_sizes
+
+
+class TickBook:
+    def __init__(self):
+        self.routes: Dict[int, TokenRoute] = {}
+        self.chains: Dict[Tuple[str, str, str], ChainView] = {}
+        self.allocate({})
+
+    def allocate(self, routes: Dict[int, TokenRoute]):
+        size = max((route.slot for route in routes.values()), default=-1) + 1
+        self.routes = routes
+        self.ltp = np.full(size, np.nan)
+        self.bid = np.full(size, np.nan)
+        self.ask = np.full(size, np.nan)
+        self.volume = np.zeros(size, dtype=np.int64)
+        self.oi = np.zeros(size, dtype=np.int64)
+        self.updated_ns = np.zeros(size, dtype=np.int64)
+
+        grouped: Dict[Tuple[str, str, str], list] = {}
+        for route in routes.values():
+            key = (route.underlying, route.expiry, route.option_type)
+            grouped.setdefault(key, []).append(route)
+        self.chains.clear()
+        for key, chain_routes in grouped.items():
+            chain_routes.sort(key=lambda route: route.strike)
+            self.chains[key] = ChainView(
+                np.array([route.strike for route in chain_routes], dtype=np.float64),
+                np.array([route.slot for route in chain_routes], dtype=np.int64),
+                np.array([route.lot_size for route in chain_routes], dtype=np.int64),
+            )
+
+    def update(
+        self,
+        slot: int,
+        ltp: float,
+        bid: float,
+        ask: float,
+        volume: int,
+        oi: int,
+        received_ns: int,
+    ):
+        self.ltp[slot] = ltp
+        self.bid[slot] = bid
+        self.ask[slot] = ask
+        self.volume[slot] = volume
+        self.oi[slot] = oi
+        self.updated_ns[slot] = received_ns
+
+    def update_ltp(self, slot: int, ltp: float, received_ns: int):
+        self.ltp[slot] = ltp
+        self.updated_ns[slot] = received_ns
+
+    def get_ltp(self, token: int):
+        route = self.routes.get(token)
+        if route is None:
+            return None
+        ltp = self.ltp[route.slot]
+        if np.isnan(ltp):
+            return None
+        return float(ltp)
+
+    def get_chain(self, underlying: str, expiry: str, option_type: str):
+        view = self.chains[(underlying, expiry, option_type)]
+        return view.strikes, self.ltp[view.slots]
+
+    def get_oi(self, underlying: str, expiry: str, option_type: str):
+        view = self.chains[(underlying, expiry, option_type)]
+        return view.strikes, self.oi[view.slots] // view.lot_sizes
+
+    def get_option_chain(self, underlying: str, expiry: str) -> Dict[str, Dict[float, float]]:
+        option_chain = {}
+        for (chain_underlying, chain_expiry, option_type), view in self.chains.items():
+            if chain_underlying != underlying or chain_expiry != expiry:
+                continue
+            ltps = self.ltp[view.slots]
+            quoted = ~np.isnan(ltps)
+            option_chain[option_type] = dict(
+                zip(view.strikes[quoted].tolist(), ltps[quoted].tolist())
+            )
+        return option_chain
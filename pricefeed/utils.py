@@ -1,21 +1,36 @@
+import os
+import glob
 import pandas as pd
+import pytz
 import requests
-from typing import List
-from datetime import datetime
+from typing import Dict, Set
+from datetime import date, datetime
 from time import sleep
 from dateutil.relativedelta import relativedelta
+from kiteconnect import KiteConnect
 from commons.models import Instrument
-from commons.utils import generate_trading_symbol
-from commons.constants import FREEZE_QTY, INDICES, LOT_SIZE
-from commons.enums import InstrumentType, OptionType, ExchangeType, Underlying
-from data import Cache, instruments, underlying_instruments
+from commons.constants import FREEZE_QTY, INDICES, LOT_SIZE, STRIKE_DIFF
+from commons.enums import ExpiryType, InstrumentType, OptionType, ExchangeType, Underlying
+import data
+from data import TokenRoute, instrument_index, instruments, underlying_instruments, routes
+from pricefeed import bar_builder, tick_book, strike_window, feed_pool
+from config import Config
+from errors.system_defined import ConfigurationError
+import user_com
 import logging
 
 logger = logging.getLogger(__name__)
 
+KITE_INSTRUMENTS_URL = "https://api.kite.trade/instruments"
+
 
 def filter_master_data_by_index(
-    master_data: dict, exchange: str, fno_name: str, underlying: str
+    master_data: dict,
+    exchange: str,
+    fno_name: str,
+    underlying: str,
+    expiry_types: Set[ExpiryType] = None,
+    strike_band: int = 0,
 ):
     und_name = underlying
     if underlying == "NIFTY":
@@ -77,7 +92,7 @@ def filter_master_data_by_index(
             & (master_data["segment"] == "INDICES")
         ].iloc[0]
 
-    underlying_instruments[cash_instrument["instrument_token"]] = Instrument(
+    cash = Instrument(
         cash_instrument["instrument_token"],
         cash_instrument["exchange_token"],
         ExchangeType(exchange),
@@ -88,171 +103,215 @@ def filter_master_data_by_index(
         OptionType(cash_instrument["instrument_type"]),
         f"{underlying}",
     )
-
-    Cache().push(f"{underlying}_WEEKLY", weekly_expiry)
-    Cache().push(f"{underlying}_NEXTWEEKLY", next_weekly_expiry)
-    Cache().push(f"{underlying}_MONTHLY", monthly_expiry)
-    Cache().push(
-        f"{underlying}_FUT",
-        Instrument(
-            fut_instrument["instrument_token"],
-            fut_instrument["exchange_token"],
-            ExchangeType(exchange),
-            Underlying(underlying),
-            InstrumentType("FUTIDX"),
-            fut_instrument["expiry"],
-            0,
-            OptionType(fut_instrument["instrument_type"]),
-            f"{underlying}_FUT",
-        ),
-    )
-    Cache().push(
+    future = Instrument(
         fut_instrument["instrument_token"],
-        Instrument(
-            fut_instrument["instrument_token"],
-            fut_instrument["exchange_token"],
-            ExchangeType(exchange),
-            Underlying(underlying),
-            InstrumentType("FUTIDX"),
-            fut_instrument["expiry"],
-            0,
-            OptionType(fut_instrument["instrument_type"]),
-            f"{underlying}_FUT",
-        ),
-    )
-    Cache().push(
-        f"{underlying}",
-        Instrument(
-            cash_instrument["instrument_token"],
-            cash_instrument["exchange_token"],
-            ExchangeType(exchange),
-            Underlying(underlying),
-            InstrumentType("INDICES"),
-            datetime(1970, 1, 1),
-            0,
-            OptionType(cash_instrument["instrument_type"]),
-            f"{underlying}",
-        ),
-    )
-    Cache().push(
-        cash_instrument["instrument_token"],
-        Instrument(
-            cash_instrument["instrument_token"],
-            cash_instrument["exchange_token"],
-            ExchangeType(exchange),
-            Underlying(underlying),
-            InstrumentType("INDICES"),
-            datetime(1970, 1, 1),
-            0,
-            OptionType(cash_instrument["instrument_type"]),
-            f"{underlying}",
-        ),
+        fut_instrument["exchange_token"],
+        ExchangeType(exchange),
+        Underlying(underlying),
+        InstrumentType("FUTIDX"),
+        fut_instrument["expiry"].to_pydatetime(),
+        0,
+        OptionType(fut_instrument["instrument_type"]),
+        f"{underlying}_FUT",
     )
+    underlying_instruments[cash_instrument["instrument_token"]] = cash
+
+    instrument_index.set_expiry(Underlying(underlying), ExpiryType.WEEKLY, weekly_expiry)
+    instrument_index.set_expiry(Underlying(underlying), ExpiryType.NEXTWEEKLY, next_weekly_expiry)
+    instrument_index.set_expiry(Underlying(underlying), ExpiryType.MONTHLY, monthly_expiry)
+    instrument_index.add_future(future)
+    instrument_index.add_underlying(cash)
 
+    expiry_ints = {
+        ExpiryType.WEEKLY: weekly_expiry,
+        ExpiryType.NEXTWEEKLY: next_weekly_expiry,
+        ExpiryType.MONTHLY: monthly_expiry,
+    }
+    if expiry_types:
+        expiry_ints = {expiry_type: expiry_ints[expiry_type] for expiry_type in expiry_types}
     opt_data = fno_data[
         (fno_data["segment"] == f"{exchange}-OPT")
-        & (fno_data["expiry_int"].isin([weekly_expiry, next_weekly_expiry, monthly_expiry]))
+        & (fno_data["expiry_int"].isin(list(expiry_ints.values())))
     ]
+    if strike_band:
+        opt_data = filter_strike_band(opt_data, cash_instrument, underlying, strike_band)
 
     lot_size = opt_data["lot_size"].unique()[0]
     LOT_SIZE[underlying] = int(lot_size)
 
-    for _, row in opt_data.iterrows():
-        generated_trading_symbol = generate_trading_symbol(
-            row["exchange"],
-            row["name"],
-            "OPTIDX",
-            row["expiry_int"],
-            row["strike"],
-            row["instrument_type"],
-        )
-        Cache().push(
-            generated_trading_symbol,
-            Instrument(
-                row["instrument_token"],
-                row["exchange_token"],
-                ExchangeType(exchange),
-                Underlying(underlying),
-                InstrumentType("OPTIDX"),
-                row["expiry"],
-                row["strike"],
-                OptionType(row["instrument_type"]),
-                generated_trading_symbol,
-                row["lot_size"],
-            ),
-        )
-        Cache().push(
-            row["instrument_token"],
-            Instrument(
-                row["instrument_token"],
-                row["exchange_token"],
-                ExchangeType(exchange),
-                Underlying(underlying),
-                InstrumentType("OPTIDX"),
-                row["expiry"],
-                row["strike"],
-                OptionType(row["instrument_type"]),
-                generated_trading_symbol,
-                row["lot_size"],
-            ),
-        )
-        instruments.append(
-            Instrument(
-                row["instrument_token"],
-                row["exchange_token"],
-                ExchangeType(exchange),
-                Underlying(underlying),
-                InstrumentType("OPTIDX"),
-                row["expiry"],
-                row["strike"],
-                OptionType(row["instrument_type"]),
-                generated_trading_symbol,
-                row["lot_size"],
-            )
-        )
-    instruments.append(
-        Instrument(
-            fut_instrument["instrument_token"],
-            fut_instrument["exchange_token"],
-            ExchangeType(exchange),
-            Underlying(underlying),
-            InstrumentType("FUTIDX"),
-            fut_instrument["expiry"],
-            0,
-            OptionType(fut_instrument["instrument_type"]),
-            f"{underlying}_FUT",
+    register_options(opt_data, exchange, underlying)
+    instruments.append(future)
+    instruments.append(cash)
+    return instruments
+
+
+def reference_price(cash_instrument) -> float:
+    try:
+        kite = KiteConnect(api_key=Config.PRICEFEED_API_KEY)
+        kite.set_access_token(Config.PRICEFEED_ACCESS_TOKEN)
+        quote_key = f"{cash_instrument['exchange']}:{cash_instrument['tradingsymbol']}"
+        return float(kite.ltp([quote_key])[quote_key]["last_price"])
+    except Exception as ex:
+        logger.warning(f"Unable to fetch reference price for {cash_instrument['tradingsymbol']}: {ex}")
+        return None
+
+
+def filter_strike_band(opt_data: pd.DataFrame, cash_instrument, underlying: str, strike_band: int):
+    price = reference_price(cash_instrument)
+    if not price:
+        logger.warning(f"{underlying}: no reference price, loading all strikes")
+        return opt_data
+    band = strike_band * STRIKE_DIFF[underlying]
+    banded = opt_data[(opt_data["strike"] >= price - band) & (opt_data["strike"] <= price + band)]
+    if banded.empty:
+        logger.warning(f"{underlying}: no strikes within {band} of {price}, loading all strikes")
+        return opt_data
+    logger.info(f"{underlying}: {len(banded)} of {len(opt_data)} options within {band} of {price}")
+    return banded
+
+
+def required_contracts() -> Dict[str, Set[ExpiryType]]:
+    user_raw_data = user_com.get_data()
+    if isinstance(user_raw_data, dict):
+        user_raw_data = [user_raw_data]
+    required: Dict[str, Set[ExpiryType]] = {}
+    for strategy_json in user_raw_data or []:
+        required.setdefault(strategy_json["UNDERLYING"], set()).add(
+            ExpiryType(strategy_json["EXPIRY_TYPE"])
         )
+    return required
+
+
+def option_symbols(opt_data: pd.DataFrame) -> pd.Series:
+    return (
+        opt_data["exchange"]
+        + "-"
+        + opt_data["name"]
+        + "-OPTIDX-"
+        + opt_data["expiry_int"].astype(str)
+        + "-"
+        + opt_data["strike"].map("{:.1f}".format)
+        + "-"
+        + opt_data["instrument_type"]
     )
-    instruments.append(
-        Instrument(
-            cash_instrument["instrument_token"],
-            cash_instrument["exchange_token"],
-            ExchangeType(exchange),
-            Underlying(underlying),
-            InstrumentType("INDICES"),
-            datetime(1970, 1, 1),
-            0,
-            OptionType(cash_instrument["instrument_type"]),
-            f"{underlying}",
+
+
+def register_options(opt_data: pd.DataFrame, exchange: str, underlying: str):
+    exchange_type = ExchangeType(exchange)
+    underlying_type = Underlying(underlying)
+    instrument_type = InstrumentType("OPTIDX")
+    option_types = {option_type.value: option_type for option_type in OptionType}
+    expiries = {expiry: expiry.to_pydatetime() for expiry in opt_data["expiry"].unique()}
+    strikes = {}
+    for token, exchange_token, expiry, expiry_int, strike, option_type, symbol, lot_size in zip(
+        opt_data["instrument_token"].tolist(),
+        opt_data["exchange_token"].tolist(),
+        opt_data["expiry"].tolist(),
+        opt_data["expiry_int"].tolist(),
+        opt_data["strike"].tolist(),
+        opt_data["instrument_type"].tolist(),
+        option_symbols(opt_data).tolist(),
+        opt_data["lot_size"].tolist(),
+    ):
+        instrument = Instrument(
+            token,
+            exchange_token,
+            exchange_type,
+            underlying_type,
+            instrument_type,
+            expiries[expiry],
+            strikes.setdefault(strike, strike),
+            option_types[option_type],
+            symbol,
+            lot_size,
         )
-    )
-    return instruments
+        instrument_index.add(instrument, expiry_int)
+        instruments.append(instrument)
+
+
+def master_cache_path(trading_day: date) -> str:
+    return os.path.join(Config.INSTRUMENT_CACHE_DIR, f"instruments_{trading_day.strftime('%Y%m%d')}.pkl")
+
+
+def download_master_data() -> pd.DataFrame:
+    master_data = pd.read_csv(KITE_INSTRUMENTS_URL)
+    wanted = pd.Series(False, index=master_data.index)
+    for exchange, fno_name in INDICES.values():
+        wanted |= (master_data["exchange"] == exchange) & (master_data["name"] == fno_name)
+    wanted |= master_data["segment"] == "INDICES"
+    return master_data[wanted].reset_index(drop=True)
+
+
+def load_master_data() -> pd.DataFrame:
+    trading_day = datetime.now(pytz.timezone("Asia/Kolkata")).date()
+    path = master_cache_path(trading_day)
+    if os.path.exists(path):
+        try:
+            master_data = pd.read_pickle(path)
+            logger.info(f"Instrument master loaded from {path}")
+            return master_data
+        except Exception as ex:
+            logger.warning(f"Discarding unreadable instrument cache {path}: {ex}")
+
+    master_data = download_master_data()
+    os.makedirs(Config.INSTRUMENT_CACHE_DIR, exist_ok=True)
+    for stale in glob.glob(os.path.join(Config.INSTRUMENT_CACHE_DIR, "instruments_*.pkl")):
+        os.remove(stale)
+    temp_path = f"{path}.tmp"
+    master_data.to_pickle(temp_path)
+    os.replace(temp_path, path)
+    logger.info(f"Instrument master cached at {path}")
+    return master_data
 
 
 def load_instruments():
-    master_data = pd.read_csv("https://api.kite.trade/instruments")
+    master_data = load_master_data()
+
+    required = None
+    if Config.LAZY_INSTRUMENTS:
+        required = required_contracts()
+        if not required:
+            raise ConfigurationError("LAZY_INSTRUMENTS is set but parameters.json names no contracts to load")
+        unknown = set(required) - set(INDICES)
+        if unknown:
+            raise ConfigurationError(f"parameters.json names unknown underlyings {sorted(unknown)}")
+        logger.info(f"Loading instruments for {required}")
 
-    all_instruments: List[Instrument] = []
     for index, index_info in INDICES.items():
-        instruments = filter_master_data_by_index(
+        if required is not None and index not in required:
+            continue
+        filter_master_data_by_index(
             master_data=master_data,
             exchange=index_info[0],
             fno_name=index_info[1],
             underlying=index,
+            expiry_types=required[index] if required is not None else None,
+            strike_band=Config.INSTRUMENT_STRIKE_BAND if required is not None else 0,
         )
-        all_instruments += instruments
 
-    logging.info(len(instruments))
+    instrument_index.build_strikes()
+    build_routes()
+    # keep bars for every underlying from the start so a late strategy can prefill its range
+    for token in underlying_instruments:
+        bar_builder.track(int(token))
+    strike_window.allocate(data.instruments)
+    feed_pool.allocate(routes.keys())
+    logger.info(f"Feed sharded over {len(feed_pool)} connections")
+    logger.info(f"Loaded {len(data.instruments)} instruments")
+
+
+def build_routes():
+    routes.clear()
+    for slot, instrument in enumerate(instruments):
+        routes[int(instrument.pricefeed_token)] = TokenRoute(
+            slot,
+            instrument.underlying.name,
+            instrument.expiry_date.strftime("%Y-%m-%d"),
+            instrument.option_type.name,
+            instrument.strike_price,
+            int(instrument.lot_size),
+        )
+    tick_book.allocate(routes)
 
 
 def get_freeze_qty():
@@ -287,9 +346,11 @@ def get_freeze_qty():
             df['expiry'] = df['ContractExpiration'].dt.strftime('%y%m%d').astype(int)
 
             for index in INDICES.keys():
-                weekly_exp = Cache().pull(f"{index}_WEEKLY")
-                next_weekly_exp = Cache().pull(f"{index}_NEXTWEEKLY")
-                monthly_exp = Cache().pull(f"{index}_MONTHLY")
+                if Underlying(index) not in instrument_index.underlyings:
+                    continue
+                weekly_exp = instrument_index.get_expiry(Underlying(index), ExpiryType.WEEKLY)
+                next_weekly_exp = instrument_index.get_expiry(Underlying(index), ExpiryType.NEXTWEEKLY)
+                monthly_exp = instrument_index.get_expiry(Underlying(index), ExpiryType.MONTHLY)
                 index_df = df[(df["Name"] == index)]
                 weekly_freeze_qty = index_df[index_df["expiry"]==weekly_exp]["FreezeQty"].iloc[0]
                 next_weekly_freeze_qty = index_df[index_df["expiry"]==next_weekly_exp]["FreezeQty"].iloc[0]
@@ -0,0 +1,100 @@
+import logging
+from typing import Dict, List, Set, Tuple
+from commons.constants import STRIKE_DIFF
+from commons.enums import InstrumentType
+from commons.models import Instrument
+from commons.utils import round_to
+
+logger = logging.getLogger(__name__)
+
+
+class StrikeWindow:
+    def __init__(self, width: int, ltp_outside: bool):
+        self.width = width
+        self.ltp_outside = ltp_outside
+        self.underlying_tokens: Dict[int, str] = {}
+        self.always_full: Set[int] = set()
+        self.option_tokens: Dict[str, Dict[float, List[int]]] = {}
+        self.loaded_strikes: Dict[str, Tuple[float, float]] = {}
+        self.atm: Dict[str, float] = {}
+        self.windows: Dict[str, Set[int]] = {}
+        self.pinned: Set[int] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.width > 0
+
+    def allocate(self, instruments: List[Instrument]):
+        self.underlying_tokens.clear()
+        self.always_full.clear()
+        self.option_tokens.clear()
+        for instrument in instruments:
+            token = int(instrument.pricefeed_token)
+            if instrument.instrument_type == InstrumentType.OPTIDX:
+                strikes = self.option_tokens.setdefault(instrument.underlying.name, {})
+                strikes.setdefault(float(instrument.strike_price), []).append(token)
+                continue
+            if instrument.instrument_type == InstrumentType.INDICES:
+                self.underlying_tokens[token] = instrument.underlying.name
+            self.always_full.add(token)
+        self.loaded_strikes = {
+            underlying: (min(strikes), max(strikes))
+            for underlying, strikes in self.option_tokens.items()
+        }
+
+    def all_option_tokens(self) -> Set[int]:
+        return {
+            token
+            for strikes in self.option_tokens.values()
+            for tokens in strikes.values()
+            for token in tokens
+        }
+
+    def full_tokens(self) -> Set[int]:
+        full = self.always_full | self.pinned
+        for window in self.windows.values():
+            full |= window
+        return full
+
+    def initial_modes(self) -> Tuple[Set[int], Set[int]]:
+        full = self.full_tokens()
+        ltp = self.all_option_tokens() - full if self.ltp_outside else set()
+        return full, ltp
+
+    def tokens_around(self, underlying: str, atm: float) -> Set[int]:
+        strike_diff = STRIKE_DIFF[underlying]
+        lower = atm - self.width * strike_diff
+        upper = atm + self.width * strike_diff
+        return {
+            token
+            for strike, tokens in self.option_tokens.get(underlying, {}).items()
+            if lower <= strike <= upper
+            for token in tokens
+        }
+
+    def on_underlying_tick(self, token: int, ltp: float):
+        underlying = self.underlying_tokens[token]
+        atm = round_to(ltp, STRIKE_DIFF[underlying])
+        if self.atm.get(underlying) == atm:
+            return None
+        self.atm[underlying] = atm
+        loaded = self.loaded_strikes.get(underlying)
+        if loaded and not loaded[0] <= atm <= loaded[1]:
+            # the strike band is fixed at startup, so these strikes cannot be traded
+            logger.error(
+                f"{underlying} ATM {atm} left the loaded strikes {loaded[0]}-{loaded[1]}, restart to reload the band"
+            )
+        if not self.enabled:
+            return None
+        previous = self.windows.get(underlying, set())
+        current = self.tokens_around(underlying, atm)
+        self.windows[underlying] = current
+        full = self.full_tokens()
+        entering = current - previous - self.pinned
+        leaving = previous - full
+        return entering, leaving
+
+    def pin(self, tokens: Set[int]) -> Set[int]:
+        entering = tokens - self.full_tokens()
+        self.pinned |= tokens
+        return entering